@@ -0,0 +1,303 @@
+import os
+import sys
+import json
+import time
+import signal
+import tempfile
+import argparse
+import threading
+import subprocess
+import urllib.request
+from dotenv import load_dotenv
+import gce_metrics
+from gce_metrics import metrics, percentile
+from gce_stub_server import codigo_gce
+
+# Benchmark offline dos scripts do GCE contra o servidor simulado (gce_stub_server.py) e um Postgres local.
+# Popula a tabela items de um banco de benchmark com itens sintéticos, roda update_atas e/ou scrape_atas
+# apontados para o servidor local e mede itens/s, páginas/s, latência p50/p95 (das métricas registradas
+# pelos próprios scripts, ver gce_metrics.py) e pico de memória (RSS) do processo e dos navegadores.
+# Só toca em linhas do benchmark (IDs 'bench-', códigos '9000.').
+# Uso: python benchmark_gce.py --items 500 --latency-ms 80 --workers 4 --db-name gce_benchmark
+
+load_dotenv()
+
+STUB_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gce_stub_server.py")
+BENCH_PREFIX = "bench-"
+BENCH_CODE_PATTERN = "9000.%"
+
+# Rotas do servidor simulado contadas como "páginas": documentos HTML e blocos da listagem
+PAGE_ROUTES = {
+    "/",
+    "/Itens/Solicitacao/ConsultaGeralItens",
+    "/Atas/ItemAta/ListarTodosItensAtaVigente",
+    "/Atas/ItemAta/ListarTodosItensAtaVigenteJson",
+}
+
+def process_tree_rss(root_pid, exclude_pid=None):
+    """Soma o RSS (bytes) de root_pid e de todos os descendentes, exceto a subárvore de exclude_pid. Só Linux."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # O nome do processo vem entre parênteses e pode conter espaços
+                fields = f.read().rsplit(")", 1)[1].split()
+            children.setdefault(int(fields[1]), []).append(int(entry))
+        except (OSError, IndexError):
+            continue
+
+    total = 0
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        if pid == exclude_pid:
+            continue
+        try:
+            with open(f"/proc/{pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            pass
+        pending.extend(children.get(pid, []))
+    return total
+
+class RssSampler:
+    """Amostra em segundo plano o RSS da árvore de processos do benchmark (Python + driver + navegadores)."""
+
+    def __init__(self, exclude_pid=None, interval=0.25):
+        self.exclude_pid = exclude_pid
+        self.interval = interval
+        self.peak = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        if os.path.isdir("/proc"):
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        else:
+            # Fora do Linux: pico do próprio processo (ru_maxrss em KB no Linux, bytes no macOS)
+            import resource
+            usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.peak = usage if sys.platform == "darwin" else usage * 1024
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self.peak = max(self.peak, process_tree_rss(os.getpid(), self.exclude_pid))
+            self.stop_event.wait(self.interval)
+
+class StubServer:
+    """Sobe gce_stub_server.py em um processo separado, para que o servidor não entre na medição de memória."""
+
+    def __init__(self, port, items, ata_ratio, latency_ms, jitter_ms, seed):
+        self.base_url = f"http://127.0.0.1:{port}"
+        self.process = subprocess.Popen([
+            sys.executable, STUB_SCRIPT, "--port", str(port), "--items", str(items), "--ata-ratio", str(ata_ratio),
+            "--latency-ms", str(latency_ms), "--jitter-ms", str(jitter_ms), "--seed", str(seed),
+        ])
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                self.stats()
+                break
+            except OSError:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("Servidor simulado do GCE não respondeu.")
+                time.sleep(0.2)
+
+    def stats(self):
+        with urllib.request.urlopen(f"{self.base_url}/__stats", timeout=5) as response:
+            return json.load(response)
+
+    def reset(self):
+        urllib.request.urlopen(f"{self.base_url}/__reset", timeout=5).close()
+
+    def close(self):
+        self.process.send_signal(signal.SIGINT)
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+def ensure_items_table(conn):
+    """Banco de benchmark vazio: cria as tabelas items e movimentos só com as colunas que os scripts usam."""
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS items (
+                id text PRIMARY KEY,
+                setor text NOT NULL,
+                codigo_gce text,
+                item_nome text NOT NULL,
+                ata text,
+                validade_ata timestamp,
+                valor_unitario_ata numeric,
+                validade_valor_referencia timestamp,
+                valor_unitario_referencia numeric,
+                data_atualizacao timestamp
+            )
+        """)
+        # Lida pela ordem de urgência do update_atas (itens movimentados recentemente)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS movimentos (
+                id text PRIMARY KEY,
+                item_id text NOT NULL REFERENCES items(id) ON DELETE CASCADE,
+                data_movimento timestamp NOT NULL DEFAULT now()
+            )
+        """)
+        conn.commit()
+    finally:
+        cur.close()
+
+def seed_database(conn, items, setores, missing):
+    """
+    Recria os itens do benchmark: items códigos presentes no portal simulado mais missing códigos
+    inexistentes, cada um repetido em setores linhas (como a tabela real, com uma linha por setor).
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("DELETE FROM items WHERE id LIKE %s", (f"{BENCH_PREFIX}%",))
+        cur.execute("DELETE FROM gce_consultas WHERE codigo_gce LIKE %s", (BENCH_CODE_PATTERN,))
+        rows = [(f"{BENCH_PREFIX}{i}-{s}", f"SETOR {s}", codigo_gce(i), f"ITEM {i}")
+                for i in range(items + missing) for s in range(setores)]
+        cur.executemany("INSERT INTO items (id, setor, codigo_gce, item_nome) VALUES (%s, %s, %s, %s)", rows)
+        conn.commit()
+        return len(rows)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+def page_count(stub_stats):
+    return sum(entry["requisicoes"] for route, entry in stub_stats["rotas"].items() if route in PAGE_ROUTES)
+
+def summarize(name, wall, units, latencies, stub_stats, peak_rss):
+    pages = page_count(stub_stats)
+    requests = sum(entry["requisicoes"] for entry in stub_stats["rotas"].values())
+    p50, p95 = percentile(latencies, 50), percentile(latencies, 95)
+    return {
+        "script": name,
+        "duracao_s": round(wall, 2),
+        "itens": units,
+        "itens_por_s": round(units / wall, 2) if wall else None,
+        "paginas": pages,
+        "paginas_por_s": round(pages / wall, 2) if wall else None,
+        "requisicoes": requests,
+        "latencia_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+        "latencia_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        "amostras_latencia": len(latencies),
+        "pico_rss_mb": round(peak_rss / 1024 / 1024, 1),
+    }
+
+def bench_update_atas(stub, total_rows, workers, lean, combined):
+    import update_atas
+
+    stub.reset()
+    with RssSampler(exclude_pid=stub.process.pid) as rss:
+        start = time.monotonic()
+        update_atas.update_atas(workers=workers, full=True, lean=lean, combined=combined)
+        wall = time.monotonic() - start
+    # Latência por código consultado, registrada pelo próprio script (gce_metrics)
+    return summarize("update_atas", wall, total_rows, list(metrics.items), stub.stats(), rss.peak)
+
+def bench_scrape_atas(stub, mode, lean):
+    import scrape_atas_vigentes
+
+    stub.reset()
+    with RssSampler(exclude_pid=stub.process.pid) as rss:
+        start = time.monotonic()
+        scrape_atas_vigentes.scrape_atas(mode=mode, lean=lean)
+        wall = time.monotonic() - start
+    # No scrape a unidade de latência é a página (ou bloco AJAX) da listagem
+    rows = metrics.counters.get("linhas_lidas", 0)
+    return summarize("scrape_atas", wall, rows, list(metrics.items), stub.stats(), rss.peak)
+
+def print_report(results):
+    print("\n=== Benchmark GCE (servidor simulado) ===")
+    for r in results:
+        print(f"{r['script']}: {r['itens']} itens em {r['duracao_s']} s -> {r['itens_por_s']} itens/s, "
+              f"{r['paginas_por_s']} páginas/s ({r['paginas']} páginas, {r['requisicoes']} requisições), "
+              f"latência p50={r['latencia_p50_ms']} ms p95={r['latencia_p95_ms']} ms "
+              f"({r['amostras_latencia']} amostras), pico RSS={r['pico_rss_mb']} MB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark offline de update_atas e scrape_atas contra um GCE simulado.")
+    parser.add_argument("--scripts", default="update,scrape", help="Scripts a medir, separados por vírgula: update, scrape")
+    parser.add_argument("--items", type=int, default=200, help="Códigos presentes no portal simulado")
+    parser.add_argument("--setores", type=int, default=2, help="Linhas em items por código (uma por setor)")
+    parser.add_argument("--missing", type=int, default=10, help="Códigos em items que não existem no portal")
+    parser.add_argument("--ata-ratio", type=float, default=0.7, help="Fração dos itens com ata vigente")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Latência fixa de cada requisição ao portal simulado")
+    parser.add_argument("--jitter-ms", type=float, default=20, help="Latência extra aleatória de até N ms")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--combined", action="store_true", help="Roda update_atas no modo combinado")
+    parser.add_argument("--mode", choices=["auto", "ajax", "paginate"], default="auto", help="Modo do scrape_atas")
+    parser.add_argument("--lean", action="store_true", help="Usa o perfil enxuto do navegador")
+    parser.add_argument("--db-name", default=os.getenv("GCE_BENCH_DB_NAME", "gce_benchmark"),
+                        help="Banco usado no benchmark (padrão: GCE_BENCH_DB_NAME ou gce_benchmark)")
+    parser.add_argument("--allow-main-db", action="store_true",
+                        help="Permite usar o mesmo banco configurado em DB_NAME (só linhas do benchmark são alteradas)")
+    parser.add_argument("--json", help="Grava o resultado em um arquivo JSON")
+    args = parser.parse_args()
+
+    if args.db_name == os.getenv("DB_NAME") and not args.allow_main_db:
+        print(f"ERRO: --db-name {args.db_name} é o banco da aplicação. Use um banco de benchmark ou --allow-main-db.")
+        sys.exit(1)
+
+    stub = StubServer(args.port, args.items, args.ata_ratio, args.latency_ms, args.jitter_ms, args.seed)
+    session_dir = tempfile.mkdtemp(prefix="gce_bench_")
+
+    # Os scripts leem a configuração ao serem importados: o ambiente precisa estar pronto antes
+    os.environ.update({
+        "GCE_BASE_URL": stub.base_url,
+        "GCE_ORG": "BENCH",
+        "GCE_MATRICULA": "0000000",
+        "GCE_PASSWORD": "benchmark",
+        "GCE_SESSION_FILE": os.path.join(session_dir, "session.json"),
+        "DB_NAME": args.db_name,
+        "HEADLESS": "true",
+    })
+    # As métricas das execuções do benchmark não podem sobrescrever as da produção
+    gce_metrics.METRICS_DIR = gce_metrics.PROM_TEXTFILE_DIR = session_dir
+
+    results = []
+    try:
+        from gce_db import get_db_connection, ensure_schema
+        conn = get_db_connection()
+        ensure_items_table(conn)
+        ensure_schema(conn)
+        total_rows = seed_database(conn, args.items, args.setores, args.missing)
+        conn.close()
+        print(f"Banco {args.db_name}: {total_rows} linhas de benchmark em items "
+              f"({args.items + args.missing} códigos x {args.setores} setores).")
+
+        scripts = {s.strip() for s in args.scripts.split(",")}
+        if "update" in scripts:
+            results.append(bench_update_atas(stub, total_rows, args.workers, args.lean, args.combined))
+        if "scrape" in scripts:
+            results.append(bench_scrape_atas(stub, args.mode, args.lean))
+    finally:
+        stub.close()
+
+    for r in results:
+        r["parametros"] = {"items": args.items, "setores": args.setores, "missing": args.missing,
+                           "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "workers": args.workers,
+                           "combined": args.combined, "mode": args.mode, "lean": args.lean}
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Resultado gravado em {args.json}.")
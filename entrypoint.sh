@@ -19,6 +19,18 @@ else
     echo "❌ ERROR: Cron service failed to start"
 fi
 
+# Worker residente do GCE (pedidos de atualização sob demanda), opcional
+if [ "$GCE_WORKER" = "true" ]; then
+    echo "Iniciando o worker residente do GCE..."
+    touch /var/log/gce_worker.log
+    # Reinicia o worker se ele sair (falha não tratada, banco fora do ar na partida, etc.)
+    (cd /app && nohup bash -c 'while true; do
+        /opt/venv/bin/python3 /app/gce_worker.py
+        echo "Worker residente saiu (código $?). Reiniciando em 10s..."
+        sleep 10
+    done' >> /var/log/gce_worker.log 2>&1 &)
+fi
+
 # If a command is passed as argument, execute it. Otherwise, start the application.
 if [ $# -gt 0 ]; then
     echo "Executando comando customizado: $@"
@@ -0,0 +1,529 @@
+import io
+import os
+import csv
+import time
+import queue
+import threading
+import psycopg2
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from gce_journal import journal_items, journal_cursor
+from gce_metrics import metrics
+
+# Acesso ao banco compartilhado pelos scripts do GCE (update_atas.py e scrape_atas_vigentes.py).
+
+load_dotenv()
+
+# Database Credentials
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = os.getenv("DB_PORT", "5432")
+DB_NAME = os.getenv("DB_NAME")
+DB_USER = os.getenv("DB_USER")
+DB_PASS = os.getenv("DB_PASS")
+
+def get_db_connection():
+    host = DB_HOST
+    port = DB_PORT
+
+    # Se estiver rodando localmente (fora do docker) e o host for 'db',
+    # ajusta para localhost e a porta externa exposta (ex: 5434)
+    if host == 'db' and not os.path.exists('/.dockerenv'):
+        print("Aviso: Rodando fora do Docker. Redirecionando conexão do banco para localhost:5434")
+        host = 'localhost'
+        port = os.getenv("DB_EXTERNAL_PORT", "5434")
+
+    return psycopg2.connect(
+        host=host,
+        port=port,
+        database=DB_NAME,
+        user=DB_USER,
+        password=DB_PASS
+    )
+
+def ensure_schema(conn):
+    """Garante as tabelas auxiliares usadas pelos scripts do GCE (espelhadas em shared/schema.ts)."""
+    cur = conn.cursor()
+    try:
+        # Última consulta de cada código no GCE, usada pela política de atualização incremental
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS gce_consultas (
+                codigo_gce text PRIMARY KEY,
+                consultado_em timestamp NOT NULL DEFAULT now(),
+                resultado text NOT NULL
+            )
+        """)
+        # Diário de execuções, usado para retomar execuções interrompidas (--resume)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS gce_execucoes (
+                id text PRIMARY KEY,
+                script text NOT NULL,
+                status text NOT NULL DEFAULT 'em_andamento',
+                cursor text,
+                parametros text,
+                iniciada_em timestamp NOT NULL DEFAULT now(),
+                atualizada_em timestamp NOT NULL DEFAULT now(),
+                finalizada_em timestamp
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS gce_execucao_itens (
+                execucao_id text NOT NULL REFERENCES gce_execucoes(id) ON DELETE CASCADE,
+                item_id text NOT NULL,
+                PRIMARY KEY (execucao_id, item_id)
+            )
+        """)
+        # Fila de pedidos de atualização do worker residente (gce_worker.py)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS gce_jobs (
+                id text PRIMARY KEY,
+                tipo text NOT NULL,
+                codigos text,
+                parametros text,
+                status text NOT NULL DEFAULT 'pendente',
+                resultado text,
+                solicitado_em timestamp NOT NULL DEFAULT now(),
+                iniciado_em timestamp,
+                finalizado_em timestamp
+            )
+        """)
+        # Histórico do que os scripts mudaram em cada item (ata renovada, preço alterado), lido pelo painel
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS gce_alteracoes (
+                id text PRIMARY KEY DEFAULT gen_random_uuid()::text,
+                item_id text NOT NULL,
+                codigo_gce text,
+                campo text NOT NULL,
+                valor_anterior text,
+                valor_novo text,
+                execucao_id text,
+                alterado_em timestamp NOT NULL DEFAULT now()
+            )
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS gce_alteracoes_alterado_em_idx ON gce_alteracoes (alterado_em)")
+        cur.execute("CREATE INDEX IF NOT EXISTS gce_alteracoes_item_id_idx ON gce_alteracoes (item_id)")
+        # Casamento da listagem de atas vigentes com os itens (VigenciaWriter)
+        cur.execute("CREATE INDEX IF NOT EXISTS items_codigo_gce_ata_idx ON items (codigo_gce, ata)")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+DATE_COLUMNS = ("validade_ata", "validade_valor_referencia")
+NUMERIC_COLUMNS = ("valor_unitario_ata", "valor_unitario_referencia")
+
+def normalize_value(col, value):
+    """
+    Forma canônica (texto) de um valor de items, para comparar o que veio do GCE ('2025-08-23',
+    '2315.31', float) com o que está no banco (datetime, Decimal). É também o texto do histórico.
+    """
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if col in DATE_COLUMNS:
+        if isinstance(value, datetime):
+            value = value.date()
+        return value.isoformat() if isinstance(value, date) else str(value).strip()[:10]
+    if col in NUMERIC_COLUMNS:
+        try:
+            return f"{Decimal(str(value).strip()).normalize():f}"
+        except InvalidOperation:
+            return str(value).strip()
+    return str(value).strip()
+
+def load_current_values(cur, item_ids):
+    """Valores atuais dos itens em uma única consulta: {id: {coluna: valor normalizado}}."""
+    cur.execute(f"""
+        SELECT id, {", ".join(AtaWriter.COLUMNS)} FROM items WHERE id = ANY(%s)
+    """, (list(item_ids),))
+    return {row[0]: {col: normalize_value(col, value) for col, value in zip(AtaWriter.COLUMNS, row[1:])}
+            for row in cur.fetchall()}
+
+class AtaWriter:
+    """
+    Acumula os resultados coletados no GCE e grava em lotes (group commit).
+    Cada resultado é de um código GCE e vale para todos os itens com esse código (um por setor).
+    Um lote é gravado quando atinge batch_size códigos ou quando o mais antigo pendente
+    espera mais de max_wait segundos. Cada lote vira um único UPDATE ... FROM (VALUES ...)
+    em uma transação; se o lote falhar, ele é dividido ao meio e regravado até isolar os
+    códigos problemáticos, de modo que só eles ficam de fora.
+    Só vão para o UPDATE os itens em que algum valor mudou, comparando com os valores atuais
+    (current, carregados uma vez para a execução, ou por lote quando não informados); cada campo
+    alterado fica registrado em gce_alteracoes.
+    """
+
+    COLUMNS = ("item_nome", "ata", "validade_ata", "valor_unitario_ata", "validade_valor_referencia", "valor_unitario_referencia")
+    REFERENCE_COLUMNS = ("validade_valor_referencia", "valor_unitario_referencia")
+
+    def __init__(self, conn, batch_size=None, max_wait=None, prefix="", run_id=None, current=None):
+        self.conn = conn
+        self.current = current
+        self.batch_size = batch_size or int(os.getenv("GCE_DB_BATCH_SIZE", "50"))
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv("GCE_DB_BATCH_SECONDS", "30"))
+        self.prefix = prefix
+        self.run_id = run_id
+        self.pending = []
+        self.pending_done = []
+        self.pending_not_found = []
+        self.first_pending_at = None
+        self.stats = {"atualizado": 0, "sem_alteracao": 0, "erro": 0}
+
+    def add(self, item_ids, codigo_gce, somente_ata=False, **fields):
+        """
+        Enfileira o resultado de um código para todos os itens em item_ids (um ID ou uma lista).
+        item_nome vazio/None preserva o nome atual de cada item. Com somente_ata=True (dados vindos
+        da listagem de atas vigentes, sem visita ao detalhe) o valor de referência atual é preservado
+        e o código não é marcado como consultado, para que o detalhe continue sendo revisitado.
+        """
+        if not isinstance(item_ids, (list, tuple)):
+            item_ids = [item_ids]
+        row = {"ids": list(item_ids), "codigo_gce": codigo_gce, "somente_ata": somente_ata}
+        row.update({col: fields.get(col) for col in self.COLUMNS})
+        row["item_nome"] = row["item_nome"] or None
+        self.pending.append(row)
+        if self.first_pending_at is None:
+            self.first_pending_at = time.monotonic()
+        if len(self.pending) >= self.batch_size or time.monotonic() - self.first_pending_at >= self.max_wait:
+            self.flush()
+
+    def mark_done(self, item_ids, codigo_nao_encontrado=None):
+        """
+        Registra no diário itens concluídos sem dados a gravar (ex: código inválido ou não encontrado).
+        codigo_nao_encontrado é o código que o portal confirmou não existir: vai para o cache negativo
+        (gce_consultas com resultado 'nao_encontrado'), que o poupa das próximas execuções até expirar.
+        """
+        if codigo_nao_encontrado:
+            self.pending_not_found.append(str(codigo_nao_encontrado).strip())
+        if self.run_id:
+            self.pending_done.extend(item_ids if isinstance(item_ids, (list, tuple)) else [item_ids])
+
+    def flush(self):
+        if self.pending_not_found:
+            codigos, self.pending_not_found = sorted(set(self.pending_not_found)), []
+            cur = self.conn.cursor()
+            try:
+                execute_values(cur, """
+                    INSERT INTO gce_consultas (codigo_gce, consultado_em, resultado)
+                    VALUES %s
+                    ON CONFLICT (codigo_gce) DO UPDATE
+                    SET consultado_em = EXCLUDED.consultado_em, resultado = EXCLUDED.resultado
+                """, [(codigo, "nao_encontrado") for codigo in codigos], template="(%s, now(), %s)", page_size=len(codigos))
+                self.conn.commit()
+            except Exception as e:
+                self.conn.rollback()
+                print(f"{self.prefix}AVISO: Falha ao registrar {len(codigos)} códigos não encontrados: {e}")
+            finally:
+                cur.close()
+        if self.pending_done:
+            done, self.pending_done = self.pending_done, []
+            cur = self.conn.cursor()
+            try:
+                journal_items(cur, self.run_id, done)
+                self.conn.commit()
+            except Exception as e:
+                self.conn.rollback()
+                print(f"{self.prefix}AVISO: Falha ao registrar {len(done)} itens no diário: {e}")
+            finally:
+                cur.close()
+        if not self.pending:
+            return
+        rows, self.pending, self.first_pending_at = self.pending, [], None
+        self._apply(rows)
+
+    def close(self):
+        self.flush()
+
+    def _apply(self, rows):
+        try:
+            with metrics.phase("banco"):
+                updated_ids, targets = self._execute(rows)
+                self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            if len(rows) == 1:
+                print(f"{self.prefix}ERRO DE BANCO no item {rows[0]['codigo_gce']} (IDs {', '.join(map(str, rows[0]['ids']))}): {e}")
+                self.stats["erro"] += len(rows[0]["ids"])
+                return
+            print(f"{self.prefix}AVISO: Falha ao gravar lote de {len(rows)} códigos, isolando os com erro: {e}")
+            middle = len(rows) // 2
+            self._apply(rows[:middle])
+            self._apply(rows[middle:])
+            return
+
+        ids = [item_id for row in rows for item_id in row["ids"]]
+        for item_id in ids:
+            if item_id not in targets:
+                print(f"{self.prefix}AVISO: Nenhuma linha atualizada para o ID {item_id}.")
+        # Mantém o retrato atual em dia, caso o mesmo item volte em outro lote da execução
+        if self.current is not None:
+            self.current.update(targets)
+        self.stats["atualizado"] += len(updated_ids)
+        self.stats["sem_alteracao"] += len(ids) - len(updated_ids)
+        print(f"{self.prefix}Lote gravado no banco: {len(rows)} códigos, {len(ids)} itens "
+              f"({len(updated_ids)} linhas alteradas, {len(ids) - len(updated_ids)} sem alteração).")
+
+    def _target(self, row, current):
+        """Valores que o item terá depois do UPDATE, na forma normalizada."""
+        target = {col: normalize_value(col, row[col]) for col in self.COLUMNS}
+        if target["item_nome"] is None:
+            target["item_nome"] = current["item_nome"]
+        if row["somente_ata"]:
+            for col in self.REFERENCE_COLUMNS:
+                target[col] = current[col]
+        return target
+
+    def _execute(self, rows):
+        """
+        Grava o lote em um único UPDATE, só com os itens alterados, e registra as consultas e o histórico.
+        Retorna (IDs atualizados, {id: valores normalizados após a gravação}).
+        """
+        cur = self.conn.cursor()
+        try:
+            ids = [item_id for row in rows for item_id in row["ids"]]
+            current = self.current if self.current is not None else load_current_values(cur, ids)
+
+            # Compara em memória: itens sem nenhuma mudança ficam fora do UPDATE (sem tupla morta nem WAL)
+            values, changes, targets = [], [], {}
+            for row in rows:
+                for item_id in row["ids"]:
+                    if item_id not in current:
+                        continue
+                    target = targets[item_id] = self._target(row, current[item_id])
+                    changed = [(col, current[item_id][col], target[col]) for col in self.COLUMNS
+                               if current[item_id][col] != target[col]]
+                    if not changed:
+                        continue
+                    # Uma linha do VALUES por item alterado: o resultado do código é replicado para os seus IDs
+                    values.append((item_id,) + tuple(row[col] for col in self.COLUMNS) + (row["somente_ata"],))
+                    changes += [(item_id, row["codigo_gce"], col, old, new, self.run_id) for col, old, new in changed]
+
+            updated = []
+            if values:
+                # Os casts fixam o tipo das colunas do VALUES mesmo quando o lote inteiro vem com NULL
+                updated = execute_values(cur, """
+                    UPDATE items AS i
+                    SET item_nome = COALESCE(v.item_nome, i.item_nome),
+                        ata = v.ata,
+                        validade_ata = v.validade_ata,
+                        valor_unitario_ata = v.valor_unitario_ata,
+                        validade_valor_referencia = CASE WHEN v.somente_ata THEN i.validade_valor_referencia ELSE v.validade_valor_referencia END,
+                        valor_unitario_referencia = CASE WHEN v.somente_ata THEN i.valor_unitario_referencia ELSE v.valor_unitario_referencia END
+                    FROM (VALUES %s) AS v(id, item_nome, ata, validade_ata, valor_unitario_ata, validade_valor_referencia, valor_unitario_referencia, somente_ata)
+                    WHERE i.id = v.id
+                    RETURNING i.id
+                """, values,
+                    template="(%s, %s, %s, %s::timestamp, %s::numeric, %s::timestamp, %s::numeric, %s::boolean)",
+                    page_size=len(values), fetch=True)
+                execute_values(cur, """
+                    INSERT INTO gce_alteracoes (item_id, codigo_gce, campo, valor_anterior, valor_novo, execucao_id)
+                    VALUES %s
+                """, changes, page_size=len(changes))
+
+            # Marca os códigos como consultados na mesma transação (base da atualização incremental)
+            codigos = sorted({str(row["codigo_gce"]).strip() for row in rows if not row["somente_ata"]})
+            if codigos:
+                execute_values(cur, """
+                    INSERT INTO gce_consultas (codigo_gce, consultado_em, resultado)
+                    VALUES %s
+                    ON CONFLICT (codigo_gce) DO UPDATE
+                    SET consultado_em = EXCLUDED.consultado_em, resultado = EXCLUDED.resultado
+                """, [(codigo, "ok") for codigo in codigos], template="(%s, now(), %s)", page_size=len(codigos))
+
+            # Diário da execução: os itens só contam como concluídos se os dados foram gravados
+            if self.run_id:
+                journal_items(cur, self.run_id, ids)
+            return {r[0] for r in updated}, targets
+        finally:
+            cur.close()
+
+class VigenciaWriter:
+    """
+    Grava a validade e o valor unitário das atas vigentes conforme as páginas da listagem chegam.
+    Recebe tuplas (validade, valor, codigo_gce, ata): cada página vai por COPY para uma tabela
+    temporária de staging e, a cada batch_size linhas (ou no flush por tempo e no fechamento), um
+    único UPDATE ... FROM aplica o staging em items pelo índice (codigo_gce, ata), junto com a
+    posição da listagem no diário da execução (run_id), quando informado. Só as linhas com valor
+    diferente são gravadas, e cada campo alterado fica registrado em gce_alteracoes.
+    """
+
+    STAGING_TABLE = "gce_vigencias_staging"
+
+    def __init__(self, conn, batch_size=None, max_wait=None, run_id=None):
+        self.conn = conn
+        self.run_id = run_id
+        self.cursor = None
+        self.batch_size = batch_size or int(os.getenv("GCE_VIGENCIA_BATCH_SIZE", "20000"))
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv("GCE_DB_BATCH_SECONDS", "30"))
+        self.staged = 0
+        self.staging_ready = False
+        self.stats = {"recebido": 0, "encontrado": 0, "atualizado": 0, "sem_correspondencia": 0, "erro": 0}
+
+    def add(self, updates, cursor=None):
+        """cursor é a posição da listagem logo após estas linhas; só é gravado junto com elas."""
+        self.stats["recebido"] += len(updates)
+        if updates:
+            self._copy(updates)
+        if cursor is not None:
+            self.cursor = cursor
+        if self.staged >= self.batch_size:
+            self.flush()
+
+    def _copy(self, updates):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(updates)
+        buffer.seek(0)
+        cur = self.conn.cursor()
+        try:
+            with metrics.phase("banco"):
+                if not self.staging_ready:
+                    # A tabela temporária vive enquanto a conexão estiver aberta e é só desta sessão
+                    cur.execute(f"""
+                        CREATE TEMP TABLE IF NOT EXISTS {self.STAGING_TABLE} (
+                            validade timestamp,
+                            valor numeric,
+                            codigo_gce text,
+                            ata text
+                        )
+                    """)
+                    self.staging_ready = True
+                cur.copy_expert(f"COPY {self.STAGING_TABLE} (validade, valor, codigo_gce, ata) FROM STDIN WITH (FORMAT csv)", buffer)
+                self.conn.commit()
+            self.staged += len(updates)
+        except Exception as db_err:
+            print(f"Erro CRÍTICO ao copiar {len(updates)} linhas da listagem para o staging: {db_err}")
+            self.conn.rollback()
+            self.staging_ready = False
+            self.stats["erro"] += len(updates)
+        finally:
+            cur.close()
+
+    def flush(self):
+        if not self.staged and self.cursor is None:
+            return
+        staged, self.staged = self.staged, 0
+        cursor, self.cursor = self.cursor, None
+        cur = self.conn.cursor()
+        try:
+            with metrics.phase("banco"):
+                matched, changed, unmatched = 0, 0, 0
+                if staged:
+                    # Uma linha por (código, ata), ficando a de validade mais longa; só grava o que mudou
+                    cur.execute(f"""
+                        WITH s AS (
+                            SELECT DISTINCT ON (codigo_gce, ata) codigo_gce, ata, validade, valor
+                            FROM {self.STAGING_TABLE}
+                            ORDER BY codigo_gce, ata, validade DESC
+                        ), alterados AS (
+                            -- O autojoin com "antigo" enxerga a linha antes do UPDATE, para o histórico
+                            UPDATE items AS i
+                            SET validade_ata = s.validade, valor_unitario_ata = s.valor
+                            FROM s, items AS antigo
+                            WHERE i.codigo_gce = s.codigo_gce AND i.ata = s.ata AND antigo.id = i.id
+                              AND (i.validade_ata IS DISTINCT FROM s.validade
+                                   OR i.valor_unitario_ata IS DISTINCT FROM s.valor)
+                            RETURNING i.id, i.codigo_gce, antigo.validade_ata AS validade_anterior,
+                                      antigo.valor_unitario_ata AS valor_anterior, s.validade, s.valor
+                        ), historico AS (
+                            INSERT INTO gce_alteracoes (item_id, codigo_gce, campo, valor_anterior, valor_novo, execucao_id)
+                            SELECT a.id, a.codigo_gce, c.campo, c.anterior, c.novo, %s
+                            FROM alterados a, LATERAL (VALUES
+                                ('validade_ata', to_char(a.validade_anterior, 'YYYY-MM-DD'), to_char(a.validade, 'YYYY-MM-DD'),
+                                 a.validade_anterior IS DISTINCT FROM a.validade),
+                                ('valor_unitario_ata', trim_scale(a.valor_anterior::numeric)::text, trim_scale(a.valor::numeric)::text,
+                                 a.valor_anterior IS DISTINCT FROM a.valor)
+                            ) AS c(campo, anterior, novo, mudou)
+                            WHERE c.mudou
+                        )
+                        SELECT
+                            (SELECT count(*) FROM items i JOIN s ON i.codigo_gce = s.codigo_gce AND i.ata = s.ata),
+                            (SELECT count(*) FROM alterados),
+                            (SELECT count(*) FROM s WHERE NOT EXISTS (
+                                SELECT 1 FROM items i WHERE i.codigo_gce = s.codigo_gce AND i.ata = s.ata))
+                    """, (self.run_id,))
+                    matched, changed, unmatched = cur.fetchone()
+                    cur.execute(f"TRUNCATE {self.STAGING_TABLE}")
+                # Depois de um lote com erro o cursor para de avançar, para que a retomada refaça esse trecho
+                if self.run_id and cursor is not None and not self.stats["erro"]:
+                    journal_cursor(cur, self.run_id, cursor)
+                self.conn.commit()
+            self.stats["encontrado"] += matched
+            self.stats["atualizado"] += changed
+            self.stats["sem_correspondencia"] += unmatched
+            if staged:
+                print(f"Lote aplicado no banco: {staged} linhas da listagem, {matched} itens encontrados, "
+                      f"{changed} alterados, {unmatched} pares (código, ata) sem item correspondente.")
+        except Exception as db_err:
+            print(f"Erro CRÍTICO ao aplicar lote de {staged} linhas da listagem: {db_err}")
+            self.conn.rollback()
+            self.stats["erro"] += staged
+            self._discard_staging()
+        finally:
+            cur.close()
+
+    def _discard_staging(self):
+        # Sem isso as linhas do lote com erro voltariam no próximo merge
+        cur = self.conn.cursor()
+        try:
+            cur.execute(f"TRUNCATE {self.STAGING_TABLE}")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            self.staging_ready = False
+        finally:
+            cur.close()
+
+    def close(self):
+        self.flush()
+
+class QueuedWriter:
+    """
+    Liga o scraping (produtor) a um writer (consumidor) por uma fila limitada, com o writer
+    rodando em uma thread própria: o navegador segue navegando enquanto o banco grava.
+    Com a fila cheia, add() bloqueia o scraping até o banco alcançar (back-pressure), o que
+    mantém a memória limitada. A espera na fila respeita o max_wait do writer, então um lote
+    parcial é gravado por tempo mesmo quando o scraping está lento.
+    """
+
+    def __init__(self, writer, maxsize=None, prefix=""):
+        self.writer = writer
+        self.prefix = prefix
+        self.queue = queue.Queue(maxsize=maxsize or int(os.getenv("GCE_PIPELINE_QUEUE", "200")))
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    @property
+    def stats(self):
+        return self.writer.stats
+
+    def add(self, *args, **kwargs):
+        self.queue.put(("add", args, kwargs))
+
+    def mark_done(self, *args, **kwargs):
+        self.queue.put(("mark_done", args, kwargs))
+
+    def close(self):
+        """Sinaliza o fim da produção e aguarda o writer gravar tudo o que está na fila."""
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            try:
+                entry = self.queue.get(timeout=self.writer.max_wait)
+            except queue.Empty:
+                self._safe(self.writer.flush)
+                continue
+            if entry is None:
+                break
+            method, args, kwargs = entry
+            self._safe(getattr(self.writer, method), *args, **kwargs)
+        self._safe(self.writer.close)
+
+    def _safe(self, fn, *args, **kwargs):
+        # Uma falha de banco não pode matar a thread: o produtor ficaria bloqueado na fila cheia
+        try:
+            fn(*args, **kwargs)
+        except Exception as db_err:
+            print(f"{self.prefix}ERRO DE BANCO no writer em segundo plano: {db_err}")
@@ -0,0 +1,47 @@
+# Extração em lote para os scripts do GCE.
+# Cada função faz um único page.evaluate e devolve todas as linhas/campos de uma vez,
+# em vez de uma chamada do Playwright (ida e volta ao navegador) por linha ou por campo.
+
+# Campos do detalhe do item (ConsultaGeralItens). Para cada campo lê a propriedade value
+# e, se vazia, o atributo value do HTML renderizado pelo servidor.
+ITEM_DETAIL_FIELDS = {
+    "nome": "#NomeModificador",
+    "validade_referencia": "#DataValidadeVuma",
+    "valor_referencia": "#ValorVumaGlobal",
+    "ata_vigente": "#ItemAtaVigente",
+}
+
+def extract_table_rows(page, row_selector="table tbody tr"):
+    """Retorna o texto de todas as células de todas as linhas: [[td, td, ...], ...]."""
+    return page.evaluate(
+        """(rowSelector) => Array.from(document.querySelectorAll(rowSelector),
+            row => Array.from(row.querySelectorAll('td'), td => td.textContent))""",
+        row_selector)
+
+def extract_table_headers(page, header_selector="table thead th"):
+    """Retorna o texto dos cabeçalhos da tabela, na ordem das colunas."""
+    return page.evaluate(
+        """(headerSelector) => Array.from(document.querySelectorAll(headerSelector), th => th.textContent.trim())""",
+        header_selector)
+
+def extract_first_row(page, row_selector):
+    """Retorna o texto das células da primeira linha que casar com row_selector, ou None."""
+    return page.evaluate(
+        """(rowSelector) => {
+            const row = document.querySelector(rowSelector);
+            return row ? Array.from(row.querySelectorAll('td'), td => td.textContent) : null;
+        }""",
+        row_selector)
+
+def extract_fields(page, fields=ITEM_DETAIL_FIELDS):
+    """
+    Lê vários inputs de uma vez. Retorna {nome_do_campo: valor}, com None para
+    campos cujo elemento não existe na página.
+    """
+    return page.evaluate(
+        """(fields) => Object.fromEntries(Object.entries(fields).map(([name, selector]) => {
+            const el = document.querySelector(selector);
+            if (!el) return [name, null];
+            return [name, el.value || el.getAttribute('value') || ''];
+        }))""",
+        fields)
@@ -0,0 +1,95 @@
+import json
+import uuid
+import select
+
+# Fila de pedidos de atualização para o worker residente (gce_worker.py), na tabela gce_jobs.
+# Um pedido é uma lista de códigos GCE ('codigos') ou uma varredura completa ('completo'); quem
+# enfileira (o servidor Node ou a linha de comando) avisa o worker por NOTIFY no canal JOBS_CHANNEL,
+# e o worker também confere a tabela periodicamente, então um aviso perdido só atrasa o pedido.
+
+JOBS_CHANNEL = "gce_jobs"
+
+def enqueue_job(conn, tipo, codigos=None, params=None):
+    """Registra um pedido ('codigos' ou 'completo') e avisa o worker. Retorna o ID do pedido."""
+    job_id = str(uuid.uuid4())
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            INSERT INTO gce_jobs (id, tipo, codigos, parametros) VALUES (%s, %s, %s, %s)
+        """, (job_id, tipo, json.dumps(codigos or []), json.dumps(params or {})))
+        # O NOTIFY só é entregue no commit, junto com o pedido
+        cur.execute("SELECT pg_notify(%s, %s)", (JOBS_CHANNEL, job_id))
+        conn.commit()
+        return job_id
+    finally:
+        cur.close()
+
+def claim_job(conn, include_full=True):
+    """
+    Pega o pedido pendente mais antigo, dando preferência aos de códigos (rápidos) sobre as varreduras.
+    Com include_full=False (uma varredura já em andamento) as varreduras pendentes ficam na fila.
+    Retorna (id, tipo, codigos, parametros) ou None se a fila estiver vazia.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            UPDATE gce_jobs SET status = 'em_andamento', iniciado_em = now()
+            WHERE id = (
+                SELECT id FROM gce_jobs
+                WHERE status = 'pendente' AND (%s OR tipo <> 'completo')
+                ORDER BY tipo = 'completo', solicitado_em
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, tipo, codigos, parametros
+        """, (include_full,))
+        row = cur.fetchone()
+        conn.commit()
+        if not row:
+            return None
+        job_id, tipo, codigos, params = row
+        return job_id, tipo, json.loads(codigos or "[]"), json.loads(params or "{}")
+    finally:
+        cur.close()
+
+def finish_job(conn, job_id, status, result=None):
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            UPDATE gce_jobs SET status = %s, resultado = %s, finalizado_em = now() WHERE id = %s
+        """, (status, json.dumps(result or {}, ensure_ascii=False), job_id))
+        conn.commit()
+    finally:
+        cur.close()
+
+def requeue_stale_jobs(conn):
+    """
+    Devolve à fila os pedidos que ficaram em andamento (worker derrubado no meio do pedido).
+    Pressupõe um único worker residente por banco, chamado na partida dele.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("UPDATE gce_jobs SET status = 'pendente', iniciado_em = NULL WHERE status = 'em_andamento'")
+        requeued = cur.rowcount
+        conn.commit()
+        return requeued
+    finally:
+        cur.close()
+
+def listen(conn):
+    """Assina o canal da fila em uma conexão dedicada (em autocommit, exigido pelo LISTEN)."""
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        cur.execute(f"LISTEN {JOBS_CHANNEL}")
+    finally:
+        cur.close()
+
+def wait_for_notify(conn, timeout):
+    """Bloqueia até chegar um aviso no canal ou passar timeout segundos. Retorna True se houve aviso."""
+    if select.select([conn], [], [], timeout) == ([], [], []):
+        return False
+    conn.poll()
+    notified = bool(conn.notifies)
+    conn.notifies.clear()
+    return notified
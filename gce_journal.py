@@ -0,0 +1,96 @@
+import os
+import json
+import uuid
+from datetime import datetime, timedelta
+from psycopg2.extras import execute_values
+
+# Diário de execuções dos scripts do GCE (tabelas gce_execucoes e gce_execucao_itens).
+# Cada execução registra o que já foi concluído: os itens gravados (update_atas.py) ou a
+# posição na listagem (scrape_atas_vigentes.py). Uma execução interrompida (navegador sem
+# memória, portal fora do ar, container reiniciado) pode ser retomada com --resume sem refazer
+# o que já foi gravado. Os registros são feitos na mesma transação dos dados, pelos writers.
+
+# Uma execução interrompida há mais de RESUME_MAX_AGE_HOURS horas não é retomada: o portal e os
+# itens já mudaram, e o cursor ou os itens concluídos dela não valem mais
+RESUME_MAX_AGE_HOURS = float(os.getenv("GCE_RESUME_MAX_AGE_HOURS", "72"))
+
+def start_run(conn, script, resume=False, params=None):
+    """
+    Abre uma execução no diário. Com resume=True reaproveita a execução mais recente do script,
+    desde que ela não tenha sido concluída e não tenha mais de RESUME_MAX_AGE_HOURS horas; uma
+    execução interrompida seguida de outra concluída nunca é retomada. Retorna (run_id, retomada, cursor).
+    """
+    cur = conn.cursor()
+    try:
+        if resume:
+            cur.execute("""
+                SELECT id, cursor, iniciada_em, status FROM gce_execucoes
+                WHERE script = %s
+                ORDER BY iniciada_em DESC
+                LIMIT 1
+            """, (script,))
+            row = cur.fetchone()
+            if row and row[3] == "concluida":
+                print(f"A última execução ({row[0]}) foi concluída. Iniciando uma nova.")
+                row = None
+            elif row and datetime.now() - row[2] > timedelta(hours=RESUME_MAX_AGE_HOURS):
+                print(f"A execução interrompida {row[0]} começou em {row[2]:%d/%m/%Y %H:%M}, há mais de "
+                      f"{RESUME_MAX_AGE_HOURS:g} horas. Iniciando uma nova.")
+                row = None
+            if row:
+                run_id, cursor, iniciada_em, _ = row
+                cur.execute("""
+                    UPDATE gce_execucoes SET status = 'em_andamento', atualizada_em = now() WHERE id = %s
+                """, (run_id,))
+                conn.commit()
+                print(f"Retomando execução {run_id} iniciada em {iniciada_em:%d/%m/%Y %H:%M} (cursor: {cursor or 'início'}).")
+                return run_id, True, cursor
+            else:
+                print("Nenhuma execução interrompida para retomar. Iniciando uma nova.")
+
+        run_id = str(uuid.uuid4())
+        cur.execute("""
+            INSERT INTO gce_execucoes (id, script, parametros) VALUES (%s, %s, %s)
+        """, (run_id, script, json.dumps(params or {})))
+        conn.commit()
+        print(f"Execução {run_id} registrada no diário.")
+        return run_id, False, None
+    finally:
+        cur.close()
+
+def load_done_items(conn, run_id):
+    """Retorna o conjunto de IDs de itens já concluídos na execução."""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT item_id FROM gce_execucao_itens WHERE execucao_id = %s", (run_id,))
+        return {row[0] for row in cur.fetchall()}
+    finally:
+        cur.close()
+
+def journal_items(cur, run_id, item_ids):
+    """Marca (sem commit) os itens como concluídos na execução, num único INSERT para o lote todo."""
+    rows = [(run_id, item_id) for item_id in item_ids]
+    if rows:
+        execute_values(cur, """
+            INSERT INTO gce_execucao_itens (execucao_id, item_id) VALUES %s
+            ON CONFLICT DO NOTHING
+        """, rows, page_size=len(rows))
+
+def journal_cursor(cur, run_id, cursor):
+    """Atualiza (sem commit) a posição da execução na listagem."""
+    cur.execute("""
+        UPDATE gce_execucoes SET cursor = %s, atualizada_em = now() WHERE id = %s
+    """, (cursor, run_id))
+
+def finish_run(conn, run_id, status="concluida"):
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            UPDATE gce_execucoes
+            SET status = %s, atualizada_em = now(),
+                finalizada_em = CASE WHEN %s = 'concluida' THEN now() ELSE NULL END
+            WHERE id = %s
+        """, (status, status, run_id))
+        conn.commit()
+    finally:
+        cur.close()
@@ -0,0 +1,234 @@
+import os
+import glob
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# Métricas de execução dos scripts do GCE: tempo de cada fase (login, navegação, busca, detalhe,
+# atas, extração, banco), contadores de resultado e latência por item. Ao final da execução são
+# gravados um resumo em JSON (lido pelo painel) e um arquivo no formato do textfile collector do
+# node_exporter (Prometheus). Os workers rodam em threads, então o registro é protegido por lock.
+# Numa execução dividida em shards (vários containers), cada shard grava o próprio relatório, com as
+# amostras brutas, e merge_reports junta todos no relatório único do script.
+
+METRICS_DIR = os.getenv("GCE_METRICS_DIR", "metrics")
+PROM_TEXTFILE_DIR = os.getenv("GCE_PROM_TEXTFILE_DIR", METRICS_DIR)
+
+# Relatórios de shard que começaram mais de SHARD_MERGE_WINDOW_HOURS horas antes do mais recente
+# são de uma execução anterior (shard que não rodou desta vez) e ficam fora do merge_reports
+SHARD_MERGE_WINDOW_HOURS = float(os.getenv("GCE_SHARD_MERGE_WINDOW_HOURS", "12"))
+
+# Limites (segundos) dos histogramas: do clique local até os timeouts de 60 s do portal
+BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30, 60, 120)
+
+def percentile(values, pct):
+    """Percentil pelo método nearest-rank; None para lista vazia."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+def summarize_samples(samples):
+    return {
+        "quantidade": len(samples),
+        "total_s": round(sum(samples), 3),
+        "p50_s": round(percentile(samples, 50), 3) if samples else None,
+        "p95_s": round(percentile(samples, 95), 3) if samples else None,
+        "max_s": round(max(samples), 3) if samples else None,
+    }
+
+class RunMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start()
+
+    def start(self, script=None, run_id=None, item_phase=None, shard=None):
+        """
+        Zera o registro para uma nova execução. item_phase indica uma fase cujas ocorrências também
+        contam como latência por item (ex: 'pagina' no scrape_atas, em que a unidade é a página da listagem).
+        shard (índice, total) identifica uma fatia de uma execução dividida entre vários processos.
+        """
+        with self.lock:
+            self.script = script
+            self.run_id = run_id
+            self.item_phase = item_phase
+            self.shard = shard
+            self.started_at = time.time()
+            self.finished_at = None
+            self.phases = {}
+            self.items = []
+            self.counters = {}
+
+    @contextmanager
+    def phase(self, name):
+        """Mede a duração do bloco como uma ocorrência da fase name, mesmo se o bloco falhar."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start)
+
+    def observe(self, name, seconds):
+        with self.lock:
+            self.phases.setdefault(name, []).append(seconds)
+            if name == self.item_phase:
+                self.items.append(seconds)
+
+    def observe_item(self, seconds):
+        """Latência de um item (no update_atas, um código consultado)."""
+        with self.lock:
+            self.items.append(seconds)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set_counters(self, counters):
+        with self.lock:
+            self.counters.update(counters)
+
+    def summary(self, status):
+        with self.lock:
+            finished_at = self.finished_at or time.time()
+            summary = {
+                "script": self.script,
+                "execucao_id": self.run_id,
+                "status": status,
+                "iniciada_em": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+                "finalizada_em": datetime.fromtimestamp(finished_at).isoformat(timespec="seconds"),
+                "duracao_s": round(finished_at - self.started_at, 3),
+                "contadores": dict(self.counters),
+                "fases": {name: summarize_samples(samples) for name, samples in self.phases.items()},
+                "latencia_item": summarize_samples(self.items),
+            }
+            if self.shard:
+                # Os percentis não se somam: o relatório do shard leva as amostras para o merge_reports
+                summary["shard"] = list(self.shard)
+                summary["inicio_ts"] = self.started_at
+                summary["fim_ts"] = finished_at
+                summary["amostras"] = {"fases": {name: list(samples) for name, samples in self.phases.items()},
+                                       "itens": list(self.items)}
+            return summary
+
+    def report_name(self):
+        if self.shard:
+            return f"gce_{self.script}_shard{self.shard[0]}-{self.shard[1]}"
+        return f"gce_{self.script}"
+
+    def write(self, status="concluida"):
+        """Grava o resumo JSON e o arquivo .prom da execução. Falhas de gravação só geram aviso."""
+        summary = self.summary(status)
+        name = self.report_name()
+        try:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            write_atomic(os.path.join(METRICS_DIR, f"{name}.json"), json.dumps(summary, ensure_ascii=False, indent=2))
+            os.makedirs(PROM_TEXTFILE_DIR, exist_ok=True)
+            with self.lock:
+                text = self.prometheus_text(summary)
+            write_atomic(os.path.join(PROM_TEXTFILE_DIR, f"{name}.prom"), text)
+            print(f"Métricas da execução gravadas em {METRICS_DIR}/{name}.json e {PROM_TEXTFILE_DIR}/{name}.prom.")
+        except Exception as e:
+            print(f"AVISO: Não foi possível gravar as métricas da execução: {e}")
+        return summary
+
+    def prometheus_text(self, summary):
+        # Cada shard exporta as mesmas métricas: o rótulo shard evita séries repetidas entre os arquivos
+        labels = f'script="{self.script}"' + (f',shard="{self.shard[0]}/{self.shard[1]}"' if self.shard else "")
+        lines = [
+            "# HELP gce_run_duration_seconds Duração da última execução.",
+            "# TYPE gce_run_duration_seconds gauge",
+            f'gce_run_duration_seconds{{{labels}}} {summary["duracao_s"]}',
+            "# HELP gce_run_last_timestamp_seconds Momento em que a última execução terminou.",
+            "# TYPE gce_run_last_timestamp_seconds gauge",
+            f'gce_run_last_timestamp_seconds{{{labels}}} {int(time.time())}',
+            "# HELP gce_run_success Indica se a última execução foi concluída (1) ou interrompida (0).",
+            "# TYPE gce_run_success gauge",
+            f'gce_run_success{{{labels}}} {1 if summary["status"] == "concluida" else 0}',
+            "# HELP gce_run_items Itens da última execução por resultado.",
+            "# TYPE gce_run_items gauge",
+        ]
+        lines += [f'gce_run_items{{{labels},resultado="{name}"}} {value}'
+                  for name, value in sorted(self.counters.items())]
+        lines += [
+            "# HELP gce_run_phase_seconds Duração das fases da última execução.",
+            "# TYPE gce_run_phase_seconds histogram",
+        ]
+        for name, samples in sorted(self.phases.items()):
+            lines += histogram_lines("gce_run_phase_seconds", f'{labels},fase="{name}"', samples)
+        lines += [
+            "# HELP gce_run_item_seconds Latência por item da última execução.",
+            "# TYPE gce_run_item_seconds histogram",
+        ]
+        lines += histogram_lines("gce_run_item_seconds", labels, self.items)
+        return "\n".join(lines) + "\n"
+
+def histogram_lines(metric, labels, samples):
+    lines = []
+    for bound in BUCKETS:
+        lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {sum(1 for s in samples if s <= bound)}')
+    lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {len(samples)}')
+    lines.append(f"{metric}_sum{{{labels}}} {sum(samples):.6f}")
+    lines.append(f"{metric}_count{{{labels}}} {len(samples)}")
+    return lines
+
+def merge_reports(script, metrics_dir=None):
+    """
+    Junta os relatórios dos shards de uma execução dividida (gce_<script>_shard<i>-<n>.json) no
+    relatório único gce_<script>.json/.prom: contadores somados, amostras reunidas e a duração do
+    primeiro início ao último fim. Só entram os relatórios iniciados até SHARD_MERGE_WINDOW_HOURS horas
+    antes do mais recente; os mais antigos sobraram de outra execução. A execução só conta como
+    concluída se todos os shards, dentro dessa janela, concluíram. Retorna o resumo gravado ou None se não houver relatórios de shard.
+    """
+    paths = sorted(glob.glob(os.path.join(metrics_dir or METRICS_DIR, f"gce_{script}_shard*.json")))
+    reports = []
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                reports.append(json.load(f))
+        except Exception as e:
+            print(f"AVISO: Relatório de shard ignorado ({path}): {e}")
+    if not reports:
+        print(f"Nenhum relatório de shard de {script} encontrado.")
+        return None
+
+    newest = max(report["inicio_ts"] for report in reports)
+    stale = [report for report in reports if report["inicio_ts"] < newest - SHARD_MERGE_WINDOW_HOURS * 3600]
+    if stale:
+        print(f"AVISO: {len(stale)} relatório(s) de shard de uma execução anterior ignorado(s): " + ", ".join(
+            f"{report['shard'][0]}/{report['shard'][1]} de {datetime.fromtimestamp(report['inicio_ts']):%d/%m/%Y %H:%M}"
+            for report in stale))
+        reports = [report for report in reports if report not in stale]
+
+    totals = {report["shard"][1] for report in reports}
+    found = sorted(report["shard"][0] for report in reports)
+    missing = [i for i in range(1, max(totals) + 1) if i not in found]
+    if len(totals) > 1 or missing:
+        print(f"AVISO: Relatórios de shard incompletos ou de divisões diferentes (encontrados: {found} de {sorted(totals)}).")
+
+    merged = RunMetrics()
+    merged.start(script, ",".join(str(report["execucao_id"]) for report in reports))
+    merged.started_at = min(report["inicio_ts"] for report in reports)
+    merged.finished_at = max(report["fim_ts"] for report in reports)
+    for report in reports:
+        for name, n in report["contadores"].items():
+            merged.count(name, n)
+        for name, samples in report["amostras"]["fases"].items():
+            merged.phases.setdefault(name, []).extend(samples)
+        merged.items.extend(report["amostras"]["itens"])
+
+    status = "concluida" if not missing and all(report["status"] == "concluida" for report in reports) else "interrompida"
+    print(f"Juntando {len(reports)} relatórios de shard de {script} ({status}).")
+    return merged.write(status)
+
+def write_atomic(path, text):
+    # O node_exporter pode ler o arquivo a qualquer momento: grava ao lado e troca de uma vez
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+# Registro único do processo, compartilhado pelos módulos e pelos workers (threads)
+metrics = RunMetrics()
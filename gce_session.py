@@ -0,0 +1,219 @@
+import os
+import json
+import time
+from urllib.parse import urlsplit
+from dotenv import load_dotenv
+from gce_wait import wait_for_login_redirect, wait_for_selector
+
+# Sessão autenticada do GCE compartilhada por update_atas.py e scrape_atas_vigentes.py.
+# O storage state do Playwright (cookies + local storage) é salvo em disco e reaproveitado
+# enquanto estiver dentro da validade, evitando refazer o login completo a cada execução.
+
+load_dotenv()
+
+# GCE Credentials
+ORG = os.getenv("GCE_ORG")
+MATRICULA = os.getenv("GCE_MATRICULA")
+PASSWORD = os.getenv("GCE_PASSWORD")
+
+# Endereço do portal; apontado para o servidor local do benchmark (gce_stub_server.py) em testes de desempenho
+BASE_URL = os.getenv("GCE_BASE_URL", "https://gce.intra.rs.gov.br").rstrip("/")
+
+# Campo de organização do formulário de login: o portal repete o ID #login no formulário de certificado
+# (oculto), então a tela de login é reconhecida pelo campo que o perform_login preenche
+LOGIN_SELECTOR = 'input#login[placeholder="Organização"]'
+
+# Cache da sessão
+SESSION_FILE = os.getenv("GCE_SESSION_FILE", ".gce_session.json")
+SESSION_TTL_MINUTES = int(os.getenv("GCE_SESSION_TTL_MINUTES", "240"))
+
+# Perfil enxuto (opt-in): bloqueia recursos que os scripts não usam (imagens, fontes, CSS, mídia)
+# e scripts de terceiros, mantendo apenas o JS necessário para o portal funcionar
+LEAN = os.getenv("GCE_LEAN", "false").lower() == "true"
+LEAN_BLOCKED_TYPES = {"image", "media", "font", "stylesheet", "manifest", "texttrack"}
+LEAN_SCRIPT_ALLOWLIST = [s.strip() for s in os.getenv(
+    "GCE_LEAN_SCRIPT_ALLOWLIST", f"{urlsplit(BASE_URL).hostname},jquery,datatables,bootstrap").split(",") if s.strip()]
+
+def launch_browser(p):
+    # Inicia o navegador (Headless True por padrão no Docker)
+    is_headless = os.getenv("HEADLESS", "true").lower() == "true"
+    return p.chromium.launch(headless=is_headless)
+
+def is_lean_blocked(request):
+    """Indica se o perfil enxuto bloqueia a requisição."""
+    if request.resource_type in LEAN_BLOCKED_TYPES:
+        return True
+    if request.resource_type == "script":
+        return not any(allowed in request.url for allowed in LEAN_SCRIPT_ALLOWLIST)
+    return False
+
+class TrafficMonitor:
+    """
+    Contabiliza o tráfego de um contexto e, no perfil enxuto, bloqueia os recursos dispensáveis.
+    O corpo de uma requisição bloqueada nunca é baixado, então o tamanho economizado não é conhecido;
+    sem o perfil enxuto, o monitor mede quanto seria bloqueado, servindo de base de comparação.
+    """
+
+    def __init__(self, lean=LEAN):
+        self.lean = lean
+        self.requests = 0
+        self.bytes = 0
+        self.blocked = {}
+        self.blockable_requests = 0
+        self.blockable_bytes = 0
+
+    def attach(self, context):
+        if self.lean:
+            context.route("**/*", self._route)
+        context.on("response", self._on_response)
+
+    def _route(self, route):
+        request = route.request
+        if is_lean_blocked(request):
+            self.blocked[request.resource_type] = self.blocked.get(request.resource_type, 0) + 1
+            route.abort()
+        else:
+            route.continue_()
+
+    def _on_response(self, response):
+        size = int(response.headers.get("content-length", "0") or 0)
+        self.requests += 1
+        self.bytes += size
+        if not self.lean and is_lean_blocked(response.request):
+            self.blockable_requests += 1
+            self.blockable_bytes += size
+
+    def report(self, prefix=""):
+        summary = f"{prefix}Tráfego: {self.requests} requisições ({self.bytes / 1024 / 1024:.1f} MB)"
+        if self.lean:
+            blocked = ", ".join(f"{t}={n}" for t, n in sorted(self.blocked.items()))
+            print(f"{summary}. Perfil enxuto bloqueou {sum(self.blocked.values())} requisições ({blocked or 'nenhuma'}).")
+        else:
+            print(f"{summary}, das quais {self.blockable_requests} ({self.blockable_bytes / 1024 / 1024:.1f} MB) "
+                  f"seriam bloqueadas pelo perfil enxuto (GCE_LEAN=true).")
+
+def new_context(browser, storage_state=None, traffic=None):
+    """Cria um contexto do navegador, ligando o monitor de tráfego (e o perfil enxuto) quando informado."""
+    context = browser.new_context(storage_state=storage_state)
+    if traffic:
+        traffic.attach(context)
+    return context
+
+def load_session():
+    """Retorna o storage state salvo, ou None se não existir, estiver corrompido ou expirado."""
+    if not os.path.exists(SESSION_FILE):
+        return None
+    try:
+        with open(SESSION_FILE, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        age_minutes = (time.time() - cached["saved_at"]) / 60
+        if age_minutes > SESSION_TTL_MINUTES:
+            print(f"Sessão em cache expirada ({age_minutes:.0f} min > {SESSION_TTL_MINUTES} min).")
+            return None
+        print(f"Reutilizando sessão em cache ({age_minutes:.0f} min).")
+        return cached["storage_state"]
+    except Exception as e:
+        print(f"AVISO: Cache de sessão inválido, será descartado: {e}")
+        return None
+
+def save_session(context):
+    """Salva o storage state do contexto autenticado. O arquivo contém cookies, então fica restrito ao dono."""
+    try:
+        state = context.storage_state()
+        tmp_file = f"{SESSION_FILE}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"saved_at": time.time(), "storage_state": state}, f)
+        os.chmod(tmp_file, 0o600)
+        os.replace(tmp_file, SESSION_FILE)
+    except Exception as e:
+        print(f"AVISO: Não foi possível salvar a sessão em cache: {e}")
+
+def clear_session():
+    try:
+        os.remove(SESSION_FILE)
+    except FileNotFoundError:
+        pass
+
+def perform_login(page, url, ready_selector):
+    """Preenche o formulário de login do GCE e confirma a sessão aguardando o ready_selector em url."""
+    try:
+        # Preenche os campos com seletores mais específicos para evitar ambiguidade
+        # O portal GCE possui múltiplos elementos com o mesmo ID para diferentes tipos de login
+        print("Preenchendo credenciais...")
+        page.locator(LOGIN_SELECTOR).fill(ORG)
+        page.locator('input#matricula[placeholder="Matrícula"]').fill(MATRICULA)
+
+        # Tenta preencher a senha e verifica se foi preenchida
+        password_selector = 'input#password[placeholder="Senha"]'
+        page.wait_for_selector(password_selector, timeout=10000)
+        password_field = page.locator(password_selector)
+        password_field.fill(PASSWORD)
+
+        # fill() só retorna após o evento de input; basta conferir o valor
+        if not password_field.input_value():
+            print("ERRO CRÍTICO: Campo de senha não foi preenchido corretamente.")
+            return False
+
+        print("Campos preenchidos. Enviando formulário...")
+        page.click('#btnLogin')
+        try:
+            wait_for_login_redirect(page)
+        except Exception:
+            # A validação abaixo decide se o login falhou de fato
+            print("AVISO: O portal não redirecionou após o login.")
+        page.goto(url)
+        # Valida se o login teve sucesso procurando pelo elemento da página de destino
+        print("Aguardando validação de login...")
+        try:
+            wait_for_selector(page, ready_selector, "validação do login", timeout=20000)
+            print("Login realizado com sucesso!")
+            return True
+        except:
+            print("ERRO: Falha ao validar login. A página de destino não carregou.")
+            page.screenshot(path="login_failed.png")
+            return False
+    except Exception as e:
+        print(f"Erro crítico durante o processo de login: {e}")
+        page.screenshot(path="login_error.png")
+        return False
+
+def open_session(browser, url, ready_selector, traffic=None):
+    """
+    Abre um contexto autenticado no GCE já posicionado em url.
+    Usa a sessão em cache quando válida; se o portal pedir login (sessão expirada no servidor),
+    descarta o cache e faz o login completo. Retorna (context, page) ou (None, None) em caso de falha.
+    """
+    storage_state = load_session()
+    context = new_context(browser, storage_state, traffic)
+    page = context.new_page()
+
+    print(f"Navegando para {url}...")
+    try:
+        page.goto(url)
+        print("Aguardando carregamento da página...")
+        wait_for_selector(page, f"{LOGIN_SELECTOR}, {ready_selector}", "carregamento inicial", timeout=30000)
+    except Exception as e:
+        print(f"Erro crítico ao carregar o GCE: {e}")
+        page.screenshot(path="login_error.png")
+        context.close()
+        return None, None
+
+    if not page.locator(LOGIN_SELECTOR).is_visible():
+        if storage_state:
+            print("Sessão em cache aceita pelo portal.")
+        else:
+            print("Já logado ou página de destino já visível.")
+        return context, page
+
+    if storage_state:
+        print("Sessão em cache recusada pelo portal. Realizando novo login...")
+        clear_session()
+    else:
+        print("Tela de login detectada. Realizando login...")
+
+    if not perform_login(page, url, ready_selector):
+        context.close()
+        return None, None
+
+    save_session(context)
+    return context, page
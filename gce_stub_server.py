@@ -0,0 +1,264 @@
+import os
+import json
+import time
+import random
+import secrets
+import argparse
+import threading
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+# Servidor local que imita o GCE para medir o desempenho dos scripts sem acesso à intranet.
+# Reproduz o login, a consulta geral de itens (busca, detalhe e atas vigentes do item) e a
+# listagem de itens com ata vigente em processamento server-side do DataTables, com latência
+# e tamanho da base configuráveis. Os dados são gerados de forma determinística a partir da semente.
+# Uso: python gce_stub_server.py --items 1000 --latency-ms 80 e GCE_BASE_URL=http://127.0.0.1:8765
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gce_fixtures")
+SESSION_COOKIE = "GCESESSION"
+
+def codigo_gce(i):
+    """Código GCE sintético no formato do portal (0000.0000.000000)."""
+    return f"9000.{i // 1000000:04d}.{i % 1000000:06d}"
+
+def format_brl(value):
+    """2315.31 -> '2.315,31'"""
+    return f"{value:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+
+class Dataset:
+    """Itens sintéticos do portal: nome, valor de referência e, para parte deles, uma ata vigente."""
+
+    def __init__(self, size, ata_ratio=0.7, seed=42):
+        rng = random.Random(seed)
+        today = date.today()
+        self.items = []
+        self.by_codigo = {}
+        for i in range(size):
+            item = {
+                "codigo": codigo_gce(i),
+                "nome": f"ITEM DE TESTE {i:06d}",
+                "validade_referencia": today + timedelta(days=rng.randint(-30, 365)),
+                "valor_referencia": round(rng.uniform(1, 5000), 2),
+                "ata": None,
+            }
+            if rng.random() < ata_ratio:
+                item["ata"] = {
+                    "numero": f"{rng.randint(1, 9999):04d}/{today.year}",
+                    "fornecedor": f"FORNECEDOR {rng.randint(1, 500):03d} LTDA",
+                    "validade": today + timedelta(days=rng.randint(1, 540)),
+                    "quantidade": rng.randint(1, 1000),
+                    "valor": round(item["valor_referencia"] * rng.uniform(0.7, 1.0), 2),
+                }
+            self.items.append(item)
+            self.by_codigo[item["codigo"]] = item
+        self.vigentes = [item for item in self.items if item["ata"]]
+
+class StubState:
+    def __init__(self, dataset, latency_ms=0, jitter_ms=0):
+        self.dataset = dataset
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.sessions = set()
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.started_at = time.time()
+
+    def count(self, route, size):
+        with self.lock:
+            entry = self.counters.setdefault(route, {"requisicoes": 0, "bytes": 0})
+            entry["requisicoes"] += 1
+            entry["bytes"] += size
+
+    def snapshot(self):
+        with self.lock:
+            return {"rotas": {route: dict(entry) for route, entry in self.counters.items()},
+                    "itens": len(self.dataset.items), "vigentes": len(self.dataset.vigentes)}
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+
+    def wait(self):
+        delay = self.latency_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay:
+            time.sleep(delay / 1000)
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+def ms_date(value):
+    """Data no formato serializado pelo ASP.NET: /Date(1692748800000)/"""
+    epoch = datetime(value.year, value.month, value.day, tzinfo=timezone.utc).timestamp()
+    return f"/Date({int(epoch * 1000)})/"
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Páginas HTML que exigem sessão; sem ela o portal redireciona para o login
+    PAGES = {
+        "/": "home.html",
+        "/Itens/Solicitacao/ConsultaGeralItens": "consulta_geral_itens.html",
+        "/Atas/ItemAta/ListarTodosItensAtaVigente": "listar_itens_ata_vigente.html",
+    }
+
+    server_version = "GCEStub/1.0"
+    state = None
+
+    def log_message(self, format, *args):
+        # O benchmark mede o tempo das requisições; o log de cada uma só atrapalharia
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def dispatch(self, method):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query, keep_blank_values=True))
+        if method == "POST":
+            length = int(self.headers.get("Content-Length", "0") or 0)
+            params.update(parse_qsl(self.rfile.read(length).decode("utf-8"), keep_blank_values=True))
+
+        if url.path == "/__stats":
+            return self.send_json(url.path, self.state.snapshot(), count=False)
+        if url.path == "/__reset":
+            self.state.reset()
+            return self.send_json(url.path, {"ok": True}, count=False)
+
+        self.state.wait()
+        if url.path == "/Account/Login":
+            return self.login(method, params)
+        if not self.authenticated():
+            if url.path in self.PAGES:
+                return self.redirect("/Account/Login")
+            return self.send_json(url.path, {"erro": "Sessão expirada"}, status=401)
+
+        if url.path in self.PAGES:
+            return self.send_html(url.path, load_fixture(self.PAGES[url.path]))
+        if url.path == "/Itens/Solicitacao/PesquisarItens":
+            return self.search(url.path, params)
+        if url.path == "/Itens/Solicitacao/DetalheItem":
+            return self.detail(url.path, params)
+        if url.path == "/Itens/Solicitacao/AtasVigentesItem":
+            return self.item_atas(url.path, params)
+        if url.path == "/Atas/ItemAta/ListarTodosItensAtaVigenteJson":
+            return self.listing(url.path, params)
+        self.send_json(url.path, {"erro": "Não encontrado"}, status=404)
+
+    # --- Sessão ---
+
+    def authenticated(self):
+        for part in self.headers.get("Cookie", "").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == SESSION_COOKIE and value in self.state.sessions:
+                return True
+        return False
+
+    def login(self, method, params):
+        if method == "GET":
+            return self.send_html("/Account/Login", load_fixture("login.html"))
+        if not all(params.get(field) for field in ("login", "matricula", "password")):
+            return self.send_html("/Account/Login", load_fixture("login.html"), status=401)
+        token = secrets.token_hex(16)
+        with self.state.lock:
+            self.state.sessions.add(token)
+        self.redirect("/", cookie=f"{SESSION_COOKIE}={token}; Path=/; HttpOnly")
+
+    # --- Consulta geral de itens ---
+
+    def search(self, route, params):
+        texto = params.get("texto", "").strip()
+        item = self.state.dataset.by_codigo.get(texto)
+        self.send_json(route, [{"codigo": item["codigo"], "nome": item["nome"]}] if item else [])
+
+    def detail(self, route, params):
+        item = self.state.dataset.by_codigo.get(params.get("codigo", ""))
+        if not item:
+            return self.send_json(route, {"erro": "Item não encontrado"}, status=404)
+        self.send_json(route, {
+            "nome": item["nome"],
+            "validadeReferencia": item["validade_referencia"].strftime("%d/%m/%Y 00:00:00"),
+            "valorReferencia": format_brl(item["valor_referencia"]),
+            "ataVigente": item["ata"] is not None,
+        })
+
+    def item_atas(self, route, params):
+        item = self.state.dataset.by_codigo.get(params.get("codigo", ""))
+        ata = item and item["ata"]
+        self.send_json(route, [{
+            "numero": ata["numero"],
+            "fornecedor": ata["fornecedor"],
+            "validade": ata["validade"].strftime("%d/%m/%Y"),
+            "quantidade": ata["quantidade"],
+            "valor": format_brl(ata["valor"]),
+        }] if ata else [])
+
+    # --- Listagem de itens com ata vigente (DataTables server-side) ---
+
+    def listing(self, route, params):
+        vigentes = self.state.dataset.vigentes
+        start = int(params.get("start", "0") or 0)
+        length = int(params.get("length", "10") or 10)
+        rows = vigentes[start:] if length < 0 else vigentes[start:start + length]
+        self.send_json(route, {
+            "draw": int(params.get("draw", "1") or 1),
+            "recordsTotal": len(vigentes),
+            "recordsFiltered": len(vigentes),
+            "data": [{
+                "Ata": item["ata"]["numero"],
+                "CodigoGce": item["codigo"],
+                "Descricao": item["nome"],
+                "ValorUnitario": item["ata"]["valor"],
+                "DataValidade": ms_date(item["ata"]["validade"]),
+            } for item in rows],
+        })
+
+    # --- Respostas ---
+
+    def redirect(self, location, cookie=None):
+        self.send_response(302)
+        self.send_header("Location", location)
+        if cookie:
+            self.send_header("Set-Cookie", cookie)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        self.state.count("redirect", 0)
+
+    def send_html(self, route, html, status=200):
+        self.send_body(route, html.encode("utf-8"), "text/html; charset=utf-8", status)
+
+    def send_json(self, route, payload, status=200, count=True):
+        self.send_body(route, json.dumps(payload).encode("utf-8"), "application/json; charset=utf-8", status, count)
+
+    def send_body(self, route, body, content_type, status=200, count=True):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if count:
+            self.state.count(route, len(body))
+
+def make_server(host="127.0.0.1", port=8765, items=1000, ata_ratio=0.7, latency_ms=0, jitter_ms=0, seed=42):
+    handler = type("Handler", (StubHandler,), {"state": StubState(Dataset(items, ata_ratio, seed), latency_ms, jitter_ms)})
+    return ThreadingHTTPServer((host, port), handler)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local que imita o GCE para o benchmark dos scripts.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--items", type=int, default=1000, help="Quantidade de itens no portal simulado")
+    parser.add_argument("--ata-ratio", type=float, default=0.7, help="Fração dos itens com ata vigente")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Latência fixa de cada requisição")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Latência extra aleatória de até N ms")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.items, args.ata_ratio, args.latency_ms, args.jitter_ms, args.seed)
+    print(f"GCE simulado em http://{args.host}:{args.port} ({args.items} itens, latência {args.latency_ms} ms)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,96 @@
+import time
+
+# Esperas orientadas a eventos para os scripts do GCE.
+# Em vez de pausas fixas (time.sleep / wait_for_timeout), cada função aguarda um sinal concreto
+# do portal e registra quanto tempo a espera realmente levou, para que a latência medida por
+# item reflita o portal e não os chutes de tempo.
+
+def timed(label, wait_fn, prefix=""):
+    """Executa wait_fn, registra a duração da espera e devolve o resultado de wait_fn."""
+    start = time.monotonic()
+    try:
+        return wait_fn()
+    finally:
+        elapsed_ms = (time.monotonic() - start) * 1000
+        print(f"{prefix}[espera] {label}: {elapsed_ms:.0f} ms")
+
+def wait_for_login_redirect(page, timeout=30000, prefix=""):
+    """Após clicar em #btnLogin, aguarda a URL mudar ou o formulário de login sumir."""
+    start_url = page.url
+    return timed("login", lambda: page.wait_for_function(
+        """(startUrl) => location.href !== startUrl || !document.querySelector('#btnLogin')""",
+        arg=start_url, timeout=timeout), prefix)
+
+def wait_for_item_detail(page, timeout=15000, prefix=""):
+    """Após o duplo clique na busca, aguarda o detalhe do item ser preenchido (#NomeModificador ou #ItemAtaVigente)."""
+    return timed("detalhe do item", lambda: page.wait_for_function(
+        """() => ['#NomeModificador', '#ItemAtaVigente'].some(sel => {
+            const el = document.querySelector(sel);
+            return el && el.value && el.value.trim() !== '';
+        })""", timeout=timeout), prefix)
+
+def search_body_is_empty(body):
+    """Resposta JSON da busca sem nenhum resultado: lista vazia ou objeto cujas listas estão todas vazias."""
+    if isinstance(body, list):
+        return not body
+    if isinstance(body, dict):
+        lists = [value for value in body.values() if isinstance(value, list)]
+        return bool(lists) and not any(lists)
+    return False
+
+def wait_for_search_result(page, codigo, submit, response_pattern="PesquisarItens", no_result_selector=None,
+                           timeout=15000, render_timeout=3000, prefix=""):
+    """
+    Executa submit (a pesquisa do código) e aguarda a resposta do portal à busca: a primeira resposta
+    XHR/fetch (ou navegação) cuja URL contém response_pattern. Se o corpo (JSON) vier sem resultados, a
+    busca está vazia; senão espera até render_timeout ms por um resultado (li) com o código ou pelo
+    aviso no_result_selector (opcional). Retorna 'encontrado', 'vazio' (só com um sinal explícito do
+    portal) ou 'sem_resposta' (o portal respondeu, mas nada apareceu a tempo); estoura o timeout se o
+    portal não responder à busca.
+    """
+    def is_search_response(response):
+        return (response.request.resource_type in ("xhr", "fetch", "document")
+                and response_pattern.lower() in response.url.lower())
+
+    def search():
+        with page.expect_response(is_search_response, timeout=timeout) as response_info:
+            submit()
+        return response_info.value
+
+    response = timed("resposta da busca", search, prefix)
+    try:
+        if search_body_is_empty(response.json()):
+            return "vazio"
+    except Exception:
+        # Corpo em HTML ou fora do formato esperado: decide pela página
+        pass
+    try:
+        handle = timed("resultado da busca", lambda: page.wait_for_function(
+            """([codigo, noResultSelector]) => {
+                const visible = el => el.offsetParent !== null;
+                if ([...document.querySelectorAll('li')].some(li => visible(li) && li.textContent.includes(codigo))) {
+                    return 'encontrado';
+                }
+                return noResultSelector && [...document.querySelectorAll(noResultSelector)].some(visible) ? 'vazio' : false;
+            }""", arg=[codigo, no_result_selector or ""], timeout=render_timeout), prefix)
+    except Exception:
+        # Sem sinal explícito de busca vazia: não vai para o cache negativo, o código é tentado de novo
+        return "sem_resposta"
+    return handle.json_value()
+
+def wait_for_selector(page, selector, label, timeout=15000, prefix=""):
+    return timed(label, lambda: page.wait_for_selector(selector, timeout=timeout), prefix)
+
+def wait_for_table_page(page, table_id, page_num, timeout=60000, prefix=""):
+    """
+    Aguarda o DataTables terminar de desenhar a página page_num: o botão da página corrente
+    mostra o número esperado, o indicador #<table_id>_processing está oculto e há linhas no tbody.
+    """
+    return timed(f"tabela página {page_num}", lambda: page.wait_for_function(
+        """([tableId, pageNum]) => {
+            const current = document.querySelector(`#${tableId}_paginate .paginate_button.current`);
+            if (current && current.textContent.trim() !== String(pageNum)) return false;
+            const processing = document.querySelector(`#${tableId}_processing`);
+            if (processing && getComputedStyle(processing).display !== 'none') return false;
+            return document.querySelectorAll(`#${tableId} tbody tr`).length > 0;
+        }""", arg=[table_id, page_num], timeout=timeout), prefix)
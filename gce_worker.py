@@ -0,0 +1,288 @@
+import os
+import time
+import signal
+import argparse
+import threading
+import psycopg2
+from playwright.sync_api import sync_playwright
+from dotenv import load_dotenv
+from gce_session import LEAN, LOGIN_SELECTOR, TrafficMonitor, launch_browser, open_session, save_session
+from gce_wait import wait_for_selector
+from gce_jobs import enqueue_job, claim_job, finish_job, requeue_stale_jobs, listen, wait_for_notify
+from gce_db import DB_NAME, DB_USER, DB_PASS, get_db_connection, ensure_schema, AtaWriter
+from gce_metrics import metrics
+from update_atas import ORG, MATRICULA, PASSWORD, SEARCH_URL, process_item, group_by_codigo, update_atas
+
+# Worker residente do GCE: mantém um navegador com a sessão autenticada aberta e atende os pedidos
+# da fila gce_jobs (gce_jobs.py) assim que chegam, sem pagar a partida do Chromium e o login a cada vez.
+# Um pedido de poucos códigos termina em segundos; a varredura completa roda o update_atas normal em
+# segundo plano, sem segurar os pedidos de códigos que chegam enquanto ela anda.
+# Uso: python gce_worker.py (residente) ou python gce_worker.py --enqueue 0000.0000.000000 [...]
+
+load_dotenv()
+
+# Intervalo (segundos) sem pedidos após o qual o worker confere a fila e renova a sessão no portal
+KEEPALIVE_SECONDS = float(os.getenv("GCE_WORKER_KEEPALIVE_SECONDS", "300"))
+# Espera (segundos) antes de tentar de novo o login ou a conexão com o banco; dobra a cada falha até o máximo
+RETRY_SECONDS = float(os.getenv("GCE_WORKER_RETRY_SECONDS", "30"))
+RETRY_MAX_SECONDS = float(os.getenv("GCE_WORKER_RETRY_MAX_SECONDS", "900"))
+# Com uma varredura em andamento, intervalo (segundos) para conferir se ela terminou
+SWEEP_POLL_SECONDS = 30
+
+def with_retry(action, what):
+    """Repete action até ela devolver algo diferente de None, com espera crescente entre as tentativas."""
+    delay = RETRY_SECONDS
+    while True:
+        try:
+            result = action()
+            if result is not None:
+                return result
+            print(f"AVISO: Não foi possível {what}. Nova tentativa em {delay:.0f}s.")
+        except Exception as e:
+            print(f"AVISO: Não foi possível {what} ({e}). Nova tentativa em {delay:.0f}s.")
+        time.sleep(delay)
+        delay = min(delay * 2, RETRY_MAX_SECONDS)
+
+def connect_queue():
+    """Abre a conexão da fila e a conexão dedicada ao LISTEN."""
+    conn = get_db_connection()
+    listen_conn = get_db_connection()
+    listen(listen_conn)
+    return conn, listen_conn
+
+def close_quietly(*conns):
+    for conn in conns:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+class WarmSession:
+    """Contexto autenticado do worker, refeito (cache em disco ou login) quando o portal derruba a sessão."""
+
+    def __init__(self, browser, lean=LEAN):
+        self.browser = browser
+        self.traffic = TrafficMonitor(lean)
+        self.context = None
+        self.page = None
+
+    def ready_page(self):
+        """Retorna a página na tela de busca com a sessão válida, ou None se não foi possível autenticar."""
+        if self.page:
+            try:
+                self.page.goto(SEARCH_URL)
+                wait_for_selector(self.page, f"{LOGIN_SELECTOR}, #textoPesquisaItem", "tela de busca", timeout=30000)
+                if not self.page.locator(LOGIN_SELECTOR).is_visible():
+                    return self.page
+                print("Sessão do worker expirou no portal. Autenticando novamente...")
+            except Exception as e:
+                print(f"AVISO: Página do worker não respondeu ({e}). Abrindo uma nova sessão...")
+            self.close()
+        self.context, self.page = open_session(self.browser, SEARCH_URL, "#textoPesquisaItem", self.traffic)
+        return self.page
+
+    def keepalive(self):
+        # Uma navegação mantém a sessão viva no servidor; o cache em disco também serve aos scripts do cron
+        if self.ready_page():
+            save_session(self.context)
+
+    def close(self):
+        if self.context:
+            try:
+                self.context.close()
+            except Exception:
+                pass
+        self.context, self.page = None, None
+
+def run_codigos_job(session, job_id, codigos, report=True):
+    """
+    Consulta os códigos pedidos na página aquecida e grava o resultado de todos os itens de cada um.
+    Com report=False (varredura em andamento) não mexe no registro de métricas, que é da varredura:
+    o resultado do pedido fica só em gce_jobs e as fases dele entram no relatório da varredura.
+    """
+    if report:
+        metrics.start("gce_worker", job_id)
+    result = {}
+    conn = None
+    writer = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT id, codigo_gce FROM items WHERE TRIM(codigo_gce) = ANY(%s)",
+                    ([str(codigo).strip() for codigo in codigos],))
+        grouped = dict(group_by_codigo(cur.fetchall()))
+        cur.close()
+
+        page = session.ready_page()
+        if page is None:
+            if report:
+                metrics.write("falha_login")
+            return "falha", {"erro": "Não foi possível autenticar no GCE"}
+
+        # Sem fila em segundo plano: o pedido é pequeno e quem pediu espera o resultado gravado
+        writer = AtaWriter(conn, batch_size=max(1, len(grouped)))
+        for codigo in codigos:
+            codigo = str(codigo).strip()
+            if codigo not in grouped:
+                result[codigo] = "sem_item"
+                continue
+            started = time.monotonic()
+            result[codigo] = process_item(page, writer, grouped[codigo], codigo)
+            if report:
+                metrics.observe_item(time.monotonic() - started)
+            if result[codigo] == "nao_encontrado":
+                writer.mark_done(grouped[codigo], codigo)
+    finally:
+        # Grava o que já foi coletado mesmo se o pedido falhar no meio (ex: navegador derrubado)
+        if writer:
+            try:
+                writer.close()
+            except Exception as e:
+                print(f"AVISO: Falha ao gravar os resultados do pedido {job_id}: {e}")
+        if conn:
+            conn.close()
+
+    counters = {s: sum(1 for v in result.values() if v == s) for s in ("coletado", "invalido", "nao_encontrado", "sem_resposta", "sem_item", "erro")}
+    counters["atualizado"] = writer.stats["atualizado"]
+    counters["erro_banco"] = writer.stats["erro"]
+    failed = counters["erro"] or counters["erro_banco"]
+    if report:
+        metrics.set_counters(counters)
+        metrics.write("interrompida" if failed else "concluida")
+    return ("falha" if failed else "concluido"), {"codigos": result, "atualizado": counters["atualizado"]}
+
+def start_full_job(params):
+    """
+    Varredura completa: roda o update_atas normal (workers, diário e métricas próprios) em outra
+    thread, que também é o que o Playwright síncrono exige para uma segunda instância. O worker segue
+    atendendo os pedidos de códigos; quando a thread termina, full_job_result lê o desfecho em outcome.
+    """
+    outcome = {}
+
+    def run():
+        try:
+            outcome["resumo"] = update_atas(full=bool(params.get("full")), combined=bool(params.get("combined")))
+        except Exception as e:
+            print(f"ERRO CRÍTICO na varredura completa: {e}")
+            outcome["erro"] = str(e)
+
+    thread = threading.Thread(target=run, name="varredura")
+    thread.start()
+    return thread, outcome
+
+def full_job_result(outcome):
+    """Status do pedido: só uma execução 'concluida' do update_atas conta como concluída."""
+    summary = outcome.get("resumo")
+    if not summary:
+        return "falha", {"erro": outcome.get("erro", "A varredura terminou sem resumo da execução")}
+    result = {"execucao": summary["status"], **summary["contadores"]}
+    return ("concluido" if summary["status"] == "concluida" else "falha"), result
+
+def serve(lean=LEAN, keepalive_seconds=KEEPALIVE_SECONDS):
+    # O docker stop envia SIGTERM: tratado como Ctrl+C; um pedido interrompido volta à fila na próxima partida
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    conn = get_db_connection()
+    ensure_schema(conn)
+    requeued = requeue_stale_jobs(conn)
+    if requeued:
+        print(f"{requeued} pedido(s) interrompido(s) devolvido(s) à fila.")
+    listen_conn = get_db_connection()
+    listen(listen_conn)
+
+    with sync_playwright() as p:
+        browser = launch_browser(p)
+        session = WarmSession(browser, lean)
+        try:
+            # Portal fora do ar ou senha expirada: o worker espera e tenta de novo em vez de sair
+            with_retry(session.ready_page, "autenticar no GCE")
+            save_session(session.context)
+            print("Worker residente pronto. Aguardando pedidos...")
+
+            sweep = None      # (id do pedido, thread, desfecho) da varredura completa em andamento
+            unsaved = []      # resultados ainda não gravados em gce_jobs (banco caiu no meio)
+            last_active = time.monotonic()
+            while True:
+                try:
+                    while unsaved:
+                        finish_job(conn, *unsaved[0])
+                        unsaved.pop(0)
+
+                    if sweep and not sweep[1].is_alive():
+                        job_id, _, outcome = sweep
+                        sweep = None
+                        status, result = full_job_result(outcome)
+                        unsaved.append((job_id, status, result))
+                        print(f"=== Varredura {job_id} {status}: {result} ===")
+                        continue
+
+                    job = claim_job(conn, include_full=sweep is None)
+                    if job is None:
+                        timeout = min(keepalive_seconds, SWEEP_POLL_SECONDS) if sweep else keepalive_seconds
+                        if not wait_for_notify(listen_conn, timeout) and time.monotonic() - last_active >= keepalive_seconds:
+                            session.keepalive()
+                            last_active = time.monotonic()
+                        continue
+                except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                    # Conexão derrubada (reinício do Postgres, rede): refaz as duas e assina o canal de novo
+                    print(f"AVISO: Conexão com o banco perdida ({e}). Reconectando...")
+                    close_quietly(conn, listen_conn)
+                    conn, listen_conn = with_retry(connect_queue, "reconectar ao banco")
+                    print("Conexão com o banco restabelecida.")
+                    continue
+
+                job_id, tipo, codigos, params = job
+                print(f"\n=== Pedido {job_id}: {tipo} {codigos if tipo == 'codigos' else params} ===")
+                started = time.monotonic()
+                last_active = started
+                if tipo == "completo":
+                    # Resultado gravado quando a thread terminar; enquanto isso outras varreduras esperam na fila
+                    sweep = (job_id, *start_full_job(params))
+                    print(f"=== Varredura {job_id} iniciada em segundo plano ===")
+                    continue
+                try:
+                    if tipo == "codigos":
+                        status, result = run_codigos_job(session, job_id, codigos, report=sweep is None)
+                    else:
+                        status, result = "falha", {"erro": f"Tipo de pedido desconhecido: {tipo}"}
+                except Exception as e:
+                    print(f"ERRO no pedido {job_id}: {e}")
+                    status, result = "falha", {"erro": str(e)}
+                unsaved.append((job_id, status, result))
+                print(f"=== Pedido {job_id} {status} em {time.monotonic() - started:.1f}s: {result} ===")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            session.traffic.report()
+            session.close()
+            browser.close()
+            close_quietly(listen_conn, conn)
+    print("Worker residente finalizado.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker residente que atende pedidos de atualização de itens do GCE.")
+    parser.add_argument("--enqueue", nargs="+", metavar="CODIGO_GCE",
+                        help="Só enfileira um pedido para os códigos informados e sai")
+    parser.add_argument("--enqueue-full", action="store_true",
+                        help="Só enfileira uma varredura completa (update_atas --full) e sai")
+    parser.add_argument("--lean", action="store_true", default=LEAN,
+                        help="Perfil enxuto: bloqueia imagens, fontes, CSS e scripts de terceiros (padrão: GCE_LEAN)")
+    parser.add_argument("--keepalive-seconds", type=float, default=KEEPALIVE_SECONDS,
+                        help="Intervalo sem pedidos para renovar a sessão no portal (padrão: GCE_WORKER_KEEPALIVE_SECONDS ou 300)")
+    args = parser.parse_args()
+
+    if not all([DB_NAME, DB_USER, DB_PASS]):
+        print("ERRO: Verifique se todas as variáveis DB estão no seu arquivo .env")
+    elif args.enqueue or args.enqueue_full:
+        conn = get_db_connection()
+        ensure_schema(conn)
+        if args.enqueue:
+            job_id = enqueue_job(conn, "codigos", args.enqueue)
+        else:
+            job_id = enqueue_job(conn, "completo", params={"full": True})
+        conn.close()
+        print(f"Pedido {job_id} enfileirado.")
+    elif not all([ORG, MATRICULA, PASSWORD]):
+        print("ERRO: Verifique se todas as variáveis GCE estão no seu arquivo .env")
+    else:
+        serve(lean=args.lean, keepalive_seconds=args.keepalive_seconds)
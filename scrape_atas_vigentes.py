@@ -1,47 +1,33 @@
 import os
-import time
 import re
-import psycopg2
+import time
+import unicodedata
+import argparse
+from urllib.parse import urlsplit, urlunsplit, parse_qsl
 from playwright.sync_api import sync_playwright
 from dotenv import load_dotenv
-from datetime import datetime
+from gce_session import BASE_URL, LEAN, TrafficMonitor, launch_browser, open_session
+from gce_wait import wait_for_table_page
+from gce_extract import extract_table_rows, extract_table_headers
+from gce_journal import start_run, finish_run
+from gce_db import get_db_connection, ensure_schema, QueuedWriter, VigenciaWriter
+from gce_metrics import metrics
+from datetime import datetime, timezone
 
 # Carrega variáveis de ambiente
 load_dotenv()
-print("Script scrape_atas_vigentes.py iniciado...")
 
 # GCE Credentials
 ORG = os.getenv("GCE_ORG")
 MATRICULA = os.getenv("GCE_MATRICULA")
 PASSWORD = os.getenv("GCE_PASSWORD")
-TARGET_URL = "https://gce.intra.rs.gov.br/Atas/ItemAta/ListarTodosItensAtaVigente"
-LOGIN_URL = "https://gce.intra.rs.gov.br/Atas/ItemAta/ListarTodosItensAtaVigente" # Usando a mesma URL de login do outro script por garantia
-
-# Database Credentials
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = os.getenv("DB_NAME")
-DB_USER = os.getenv("DB_USER")
-DB_PASS = os.getenv("DB_PASS")
-
-def get_db_connection():
-    host = DB_HOST
-    port = DB_PORT
-    
-    # Se estiver rodando localmente (fora do docker) e o host for 'db', 
-    # ajusta para localhost e a porta externa exposta (ex: 5434)
-    if host == 'db' and not os.path.exists('/.dockerenv'):
-        print("Aviso: Rodando fora do Docker. Redirecionando conexão do banco para localhost:5434")
-        host = 'localhost'
-        port = os.getenv("DB_EXTERNAL_PORT", "5434")
-
-    return psycopg2.connect(
-        host=host,
-        port=port,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASS
-    )
+TARGET_URL = f"{BASE_URL}/Atas/ItemAta/ListarTodosItensAtaVigente"
+LOGIN_URL = f"{BASE_URL}/Atas/ItemAta/ListarTodosItensAtaVigente" # Usando a mesma URL de login do outro script por garantia
+
+# Modo de coleta da tabela: 'auto' (AJAX com fallback), 'ajax' ou 'paginate'
+SCRAPE_MODE = os.getenv("GCE_SCRAPE_MODE", "auto")
+# Quantidade de linhas pedidas por requisição ao endpoint do DataTables
+DT_PAGE_LENGTH = int(os.getenv("GCE_DT_PAGE_LENGTH", "1000"))
 
 def parse_currency(value):
     if not value or value.strip() == '':
@@ -64,7 +50,468 @@ def parse_date(value):
     except:
         return None
 
-def scrape_atas():
+
+# Padrões pré-compilados usados na leitura das linhas da listagem
+CODIGO_RE = re.compile(r"^\d{4}\.\d{4}\.\d{6}$")
+DATE_RE = re.compile(r"^\d{2}/\d{2}/\d{4}$")
+MONEY_RE = re.compile(r"^\d+,\d{2}$")
+
+# Reconhecimento das colunas pelo cabeçalho (texto do <th> ou chave do JSON) já normalizado:
+# minúsculo, sem acentos e só com letras e números (ex: "Código GCE" -> "codigogce")
+HEADER_PATTERNS = {
+    "codigo_gce": re.compile(r"^(codigo|cod)(gce|item)?$"),
+    "ata": re.compile(r"^(n|no|num|numero)?(da|de)?ata(registro\w*)?$"),
+    "validade": re.compile(r"validade|vigencia|vencimento"),
+    "valor": re.compile(r"^(valor|preco|vl)(unitario|unit)?$"),
+}
+
+# Quando mais de um cabeçalho casa com o campo (ex: "Início Vigência" e "Fim Vigência"), vale o que
+# casar com o padrão de preferência; sem preferido, o último. A validade da ata é o fim da vigência.
+HEADER_PREFERRED = {
+    "validade": re.compile(r"^(?!.*inicio).*(fim|final|termino|validade|vencimento)"),
+}
+
+def normalize_header(text):
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+def build_column_map(headers):
+    """Retorna {campo: índice da coluna} a partir dos cabeçalhos, ou None se algum campo não for reconhecido."""
+    normalized = [normalize_header(h) for h in headers]
+    column_map = {}
+    for field, pattern in HEADER_PATTERNS.items():
+        candidates = [i for i, h in enumerate(normalized) if pattern.search(h)]
+        if not candidates:
+            return None
+        preferred = HEADER_PREFERRED.get(field)
+        chosen = [i for i in candidates if preferred and preferred.search(normalized[i])] or candidates
+        column_map[field] = chosen[-1]
+        if len(candidates) > 1:
+            print(f"AVISO: {len(candidates)} colunas casam com '{field}' "
+                  f"({', '.join(repr(headers[i]) for i in candidates)}); usando {headers[column_map[field]]!r}.")
+    return column_map
+
+class RowParser:
+    """
+    Interpreta as linhas da listagem de itens com ata vigente, devolvendo a tupla
+    (validade, valor, codigo_gce, ata) pronta para o UPDATE ou None se a linha não serve.
+    Com o mapa de colunas (montado uma vez a partir do thead) cada campo é lido pela posição;
+    sem ele, cai na heurística que procura o código, a data, o valor e a ata em todas as células.
+    As linhas rejeitadas são contadas por motivo.
+    """
+
+    def __init__(self, column_map=None):
+        self.column_map = column_map
+        self.rejected = {}
+
+    @classmethod
+    def from_headers(cls, headers):
+        column_map = build_column_map(headers) if headers else None
+        if column_map:
+            print(f"Colunas da listagem reconhecidas pelo cabeçalho: {column_map}")
+        else:
+            print(f"AVISO: Cabeçalho da listagem não reconhecido ({headers}). Usando a leitura heurística.")
+        return cls(column_map)
+
+    def parse(self, cells):
+        parsed, reason = self._parse_by_position(cells) if self.column_map else self._parse_heuristic(cells)
+        if reason:
+            self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        return parsed
+
+    def parse_all(self, rows):
+        return [parsed for parsed in map(self.parse, rows) if parsed]
+
+    def report(self):
+        for reason, n in self.rejected.items():
+            metrics.count(f"rejeitada_{reason}", n)
+        if self.rejected:
+            reasons = ", ".join(f"{reason}={n}" for reason, n in sorted(self.rejected.items()))
+            print(f"Linhas rejeitadas: {sum(self.rejected.values())} ({reasons}).")
+
+    def _parse_by_position(self, cells):
+        if len(cells) <= max(self.column_map.values()):
+            return None, "colunas_insuficientes"
+        codigo_gce = cells[self.column_map["codigo_gce"]].strip()
+        if not CODIGO_RE.match(codigo_gce):
+            return None, "codigo_invalido"
+        ata_db = cells[self.column_map["ata"]].strip()
+        if not ata_db:
+            return None, "sem_ata"
+        # A célula pode trazer hora junto da data (dd/mm/aaaa hh:mm:ss)
+        validade_db = parse_date(cells[self.column_map["validade"]].strip()[:10])
+        if not validade_db:
+            return None, "validade_invalida"
+        valor_db = parse_currency(cells[self.column_map["valor"]])
+        return (validade_db, valor_db, codigo_gce, ata_db), None
+
+    def _parse_heuristic(self, cells):
+        if len(cells) < 5:
+            return None, "colunas_insuficientes"
+
+        stripped = [cell.strip() for cell in cells]
+
+        # Encontra Codigo GCE formatado (ex: 0000.0000.000000)
+        codigo_gce = next((cell for cell in stripped if CODIGO_RE.match(cell)), None)
+        if not codigo_gce:
+            return None, "codigo_invalido"
+
+        # Coleta Validade do Final da Linha
+        if DATE_RE.match(stripped[-1]):
+            validade_str = stripped[-1]
+        else:
+            dates = [cell for cell in stripped if DATE_RE.match(cell)]
+            validade_str = dates[-1] if dates else None
+        validade_db = parse_date(validade_str)
+
+        # Coleta Valor (Money)
+        money = next((cell for cell in stripped if "R$" in cell or MONEY_RE.match(cell)), None)
+        valor_db = parse_currency(money) if money else None
+
+        # Coleta Número da ATA ignorando Datas
+        ata_db = next((cell for cell in stripped if "/" in cell and not DATE_RE.match(cell) and len(cell) < 20), None)
+
+        if not ata_db:
+            return None, "sem_ata"
+        if not validade_db:
+            return None, "validade_invalida"
+        return (validade_db, valor_db, codigo_gce, ata_db), None
+
+# --- MODO AJAX (DataTables) ---
+
+def json_value_to_cell(value):
+    """Converte um valor do JSON do DataTables para o mesmo texto que apareceria na célula renderizada."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "Sim" if value else "Não"
+    if isinstance(value, float):
+        # Mesmo formato monetário exibido na tela (ex: 2315,31)
+        return f"{value:.2f}".replace(".", ",")
+    text = str(value)
+    # Datas serializadas pelo ASP.NET: /Date(1692748800000)/
+    ms_date = re.match(r"^/Date\((-?\d+)[^)]*\)/$", text)
+    if ms_date:
+        return datetime.fromtimestamp(int(ms_date.group(1)) / 1000, timezone.utc).strftime('%d/%m/%Y')
+    # Datas ISO: 2025-08-23T00:00:00
+    iso_date = re.match(r"^(\d{4})-(\d{2})-(\d{2})(T[\d:.]+)?$", text)
+    if iso_date:
+        return f"{iso_date.group(3)}/{iso_date.group(2)}/{iso_date.group(1)}"
+    # Remove marcações HTML (links, spans) que o DataTables renderizaria
+    return re.sub(r"<[^>]+>", "", text).strip()
+
+def read_request_params(request):
+    """Retorna os parâmetros (query string ou formulário) de uma requisição capturada."""
+    params = parse_qsl(urlsplit(request.url).query, keep_blank_values=True)
+    post_data = request.post_data
+    if post_data and "=" in post_data and not post_data.lstrip().startswith("{"):
+        params += parse_qsl(post_data, keep_blank_values=True)
+    return dict(params)
+
+def find_datatables_response(responses):
+    """Procura, entre as respostas XHR capturadas, a que alimenta a tabela (JSON com 'data' ou 'aaData')."""
+    for response in responses:
+        try:
+            body = response.json()
+        except Exception:
+            continue
+        if isinstance(body, dict) and isinstance(body.get("data", body.get("aaData")), list):
+            return response, body
+    return None, None
+
+def json_rows_to_cells(rows, column_keys):
+    cells_list = []
+    for row in rows:
+        if isinstance(row, dict):
+            keys = column_keys or list(row.keys())
+            cells_list.append([json_value_to_cell(row.get(k)) for k in keys])
+        elif isinstance(row, list):
+            cells_list.append([json_value_to_cell(v) for v in row])
+    return cells_list
+
+def iter_datatables_blocks(context, request, params, body, start=0):
+    """
+    Gera os blocos de linhas (JSON) da tabela a partir da linha start. Em processamento client-side a
+    primeira resposta já traz tudo; em server-side repete a requisição pedindo DT_PAGE_LENGTH linhas por vez
+    até alcançar o total informado pelo servidor (que pode devolver menos linhas que o pedido) ou,
+    sem total, até vir um bloco menor que o pedido.
+    Levanta ValueError se o endpoint deixar de responder no formato esperado.
+    """
+    # Processamento server-side (DataTables 1.10+ ou legado 1.9)
+    if "start" in params:
+        start_key, length_key, draw_key = "start", "length", "draw"
+    elif "iDisplayStart" in params:
+        start_key, length_key, draw_key = "iDisplayStart", "iDisplayLength", "sEcho"
+    else:
+        # Processamento client-side: a primeira resposta já traz todas as linhas
+        rows = body.get("data", body.get("aaData"))
+        print(f"Tabela carregada de uma vez pelo cliente: {len(rows)} linhas.")
+        yield rows[start:]
+        return
+
+    # Remove os parâmetros de paginação da URL; eles são reenviados a cada requisição
+    url_parts = urlsplit(request.url)
+    base_url = urlunsplit(url_parts._replace(query=""))
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in ("content-length", "content-type", "cookie")}
+    headers.setdefault("x-requested-with", "XMLHttpRequest")
+
+    draw = int(params.get(draw_key, "1") or 1)
+    capped = False
+    while True:
+        draw += 1
+        params[start_key] = str(start)
+        params[length_key] = str(DT_PAGE_LENGTH)
+        params[draw_key] = str(draw)
+
+        if request.method.upper() == "POST":
+            result = context.request.post(base_url, form=params, headers=headers, timeout=120000)
+        else:
+            result = context.request.get(base_url, params=params, headers=headers, timeout=120000)
+
+        if not result.ok:
+            raise ValueError(f"Endpoint do DataTables respondeu HTTP {result.status}")
+        page_body = result.json()
+        rows = page_body.get("data", page_body.get("aaData")) if isinstance(page_body, dict) else None
+        if not isinstance(rows, list):
+            raise ValueError("Resposta do DataTables sem lista de linhas")
+
+        total = page_body.get("recordsFiltered", page_body.get("iTotalDisplayRecords", page_body.get("recordsTotal")))
+        total = int(total) if total is not None else None
+        print(f"Bloco a partir de {start}: {len(rows)} linhas (total informado: {total}).")
+        if not capped and rows and len(rows) < DT_PAGE_LENGTH and total is not None and start + len(rows) < total:
+            # Servidores que limitam o length (ex: 100) devolvem blocos menores que o pedido
+            capped = True
+            print(f"AVISO: O servidor devolveu {len(rows)} linhas das {DT_PAGE_LENGTH} pedidas; "
+                  f"seguindo pelo total informado.")
+        yield rows
+
+        start += len(rows)
+        if total is not None:
+            # Com total informado, ele manda: só um bloco vazio encerra antes de alcançá-lo
+            if start >= total:
+                break
+            if not rows:
+                print(f"AVISO: O servidor parou de devolver linhas em {start} de {total} informadas.")
+                break
+        elif len(rows) < DT_PAGE_LENGTH:
+            # Sem total, um bloco menor que o pedido indica o fim da tabela
+            break
+
+def scrape_via_ajax(context, responses, writer, start=0, parser=None):
+    """
+    Reaproveita a requisição AJAX que o DataTables fez ao abrir a listagem e a repete
+    dentro do contexto logado pedindo páginas grandes, lendo as linhas direto do JSON.
+    Cada bloco recebido é entregue ao writer enquanto o próximo é buscado, junto com o cursor
+    'ajax:<linhas lidas>' para o diário; start permite retomar a partir de uma linha.
+    parser é o RowParser montado a partir do thead; quando as linhas vêm como objetos, as chaves
+    do JSON têm preferência para o mapa de colunas.
+    Retorna a quantidade de updates gerados ou None se o endpoint não tiver o formato esperado.
+    """
+    response, body = find_datatables_response(responses)
+    if response is None:
+        print("AVISO: Nenhuma requisição AJAX do DataTables foi capturada.")
+        return None
+
+    request = response.request
+    params = read_request_params(request)
+    print(f"Endpoint do DataTables detectado: {request.method} {urlsplit(request.url).path}")
+
+    # Mapeia a ordem das colunas quando as linhas vêm como objetos (columns[i][data] ou mDataProp_i)
+    column_keys = []
+    i = 0
+    while f"columns[{i}][data]" in params or f"mDataProp_{i}" in params:
+        column_keys.append(params.get(f"columns[{i}][data]", params.get(f"mDataProp_{i}")))
+        i += 1
+    first_rows = body.get("data", body.get("aaData"))
+    if not column_keys and first_rows and isinstance(first_rows[0], dict):
+        column_keys = list(first_rows[0].keys())
+
+    # As chaves do JSON cobrem também as colunas ocultas, que o DataTables tira do thead
+    key_map = build_column_map(column_keys) if column_keys else None
+    if key_map:
+        print(f"Colunas do JSON reconhecidas pelas chaves: {key_map}")
+        parser = RowParser(key_map)
+    elif parser is None:
+        parser = RowParser()
+
+    total_rows = 0
+    total_updates = 0
+    if start:
+        print(f"Retomando a listagem a partir da linha {start}.")
+    try:
+        block_started = time.monotonic()
+        for rows in iter_datatables_blocks(context, request, params, body, start):
+            metrics.observe("navegacao", time.monotonic() - block_started)
+            with metrics.phase("extracao"):
+                updates = parser.parse_all(json_rows_to_cells(rows, column_keys))
+            if rows and not updates and total_updates == 0:
+                # O JSON chegou, mas nenhuma linha foi reconhecida: formato do endpoint mudou
+                print(f"AVISO: {len(rows)} linhas recebidas via AJAX, mas nenhuma reconhecida.")
+                return None
+            total_rows += len(rows)
+            total_updates += len(updates)
+            metrics.count("linhas_lidas", len(rows))
+            writer.add(updates, cursor=f"ajax:{start + total_rows}")
+            metrics.observe("pagina", time.monotonic() - block_started)
+            block_started = time.monotonic()
+    except ValueError as e:
+        print(f"AVISO: {e}.")
+        return None
+
+    print(f"Coleta via AJAX concluída: {total_rows} linhas, {total_updates} pacotes de atualização.")
+    parser.report()
+    return total_updates
+
+# --- MODO PAGINAÇÃO (cliques na tabela renderizada) ---
+
+def goto_table_page(page, table_id, page_num):
+    """
+    Avança a tabela até page_num sem extrair nada (retomada). Usa a API do DataTables quando
+    disponível; senão clica nos botões numerados até chegar lá.
+    """
+    jumped = page.evaluate(
+        """([tableId, pageNum]) => {
+            const $ = window.jQuery;
+            if (!$ || !$.fn.dataTable || !$.fn.dataTable.Api) return false;
+            $(`#${tableId}`).DataTable().page(pageNum - 1).draw('page');
+            return true;
+        }""", [table_id, page_num])
+    if jumped:
+        return
+    current = 1
+    while current < page_num:
+        # Clica no maior número visível que não passe da página desejada
+        buttons = page.evaluate(
+            """(tableId) => Array.from(document.querySelectorAll(`#${tableId}_paginate .paginate_button`),
+                a => parseInt(a.textContent.trim(), 10)).filter(n => !isNaN(n))""", table_id)
+        candidates = [n for n in buttons if current < n <= page_num]
+        if not candidates:
+            raise ValueError(f"Não foi possível avançar a tabela até a página {page_num}")
+        current = max(candidates)
+        page.locator(f"xpath=//a[contains(@class, 'paginate_button') and text()='{current}']").first.click(force=True)
+        wait_for_table_page(page, table_id, current)
+
+def scrape_via_pagination(page, writer, start_page=1, parser=None):
+    print("Iniciando varredura com paginação...")
+    parser = parser or RowParser()
+    total_updates = 0
+    page_num = start_page
+    if start_page > 1:
+        print(f"Retomando a varredura a partir da página {start_page}...")
+        goto_table_page(page, "dtTodosItensAtaVigente", start_page)
+
+    while True:
+        print(f"--- Processando Página {page_num} ---")
+        page_started = time.monotonic()
+
+        # Aguarda o DataTables terminar de desenhar a página (aviso "Processando..." oculto e página corrente correta)
+        with metrics.phase("navegacao"):
+            wait_for_table_page(page, "dtTodosItensAtaVigente", page_num)
+
+        # Extrai o texto bruto de todas as linhas renderizadas na página atual em uma única chamada
+        with metrics.phase("extracao"):
+            rows = extract_table_rows(page, "table tbody tr")
+            updates = parser.parse_all(rows)
+        print(f"Encontradas {len(rows)} linhas na página {page_num}.")
+
+        # Entrega a página ao writer, que grava em segundo plano enquanto a próxima página carrega
+        total_updates += len(updates)
+        metrics.count("linhas_lidas", len(rows))
+        writer.add(updates, cursor=f"pagina:{page_num}")
+        metrics.observe("pagina", time.monotonic() - page_started)
+
+        # --- Paginação ---
+        # Acha o número da próxima página (ex: se estamos na 1, procura o botão "2").
+        # Isso é muito mais seguro do que um XPath absoluto (que pode quebrar) ou xpath fixo de posição a[2]
+        next_page_str = str(page_num + 1)
+        next_button = page.locator(f"xpath=//a[contains(@class, 'paginate_button') and text()='{next_page_str}']")
+
+        # Se o botão não existir, ou se chegamos na última página e por algum motivo ele ficou invisível:
+        if next_button.count() == 0 or not next_button.first.is_visible():
+            print(f"Fim da paginação (botão '{next_page_str}' não encontrado). Última página atingida: {page_num}")
+            break
+
+        # Clica na próxima página e aguarda a transição
+        print("Indo para a próxima página...")
+        # O início do loop aguarda o redesenho da nova página
+        next_button.click(force=True)
+
+        page_num += 1
+
+    print(f"\nExtração concluída com sucesso! Varremos {page_num} páginas. Gerados {total_updates} pacotes de atualização.")
+    parser.report()
+    return total_updates
+
+def scrape_listing(context, page, xhr_responses, writer, mode=SCRAPE_MODE, ajax_start=0, start_page=1):
+    """
+    Lê a listagem já aberta em page e entrega as linhas ao writer: via AJAX do DataTables e/ou
+    por paginação, conforme o modo. Retorna a quantidade de updates gerados ou None se o modo
+    AJAX foi exigido e não pôde ser usado. Erros da varredura por paginação são propagados.
+    """
+    # O cabeçalho é lido uma única vez e define a posição de cada campo nas linhas. A primeira carga
+    # da tabela também garante que a requisição AJAX do DataTables já foi feita
+    parser = None
+    try:
+        wait_for_table_page(page, "dtTodosItensAtaVigente", 1)
+        parser = RowParser.from_headers(extract_table_headers(page, "#dtTodosItensAtaVigente thead th"))
+    except Exception as header_err:
+        print(f"AVISO: Não foi possível ler o cabeçalho da listagem: {header_err}")
+
+    total_updates = None
+    if mode != "paginate":
+        try:
+            total_updates = scrape_via_ajax(context, xhr_responses, writer, ajax_start, parser)
+        except Exception as ajax_err:
+            print(f"AVISO: Falha na coleta via AJAX: {ajax_err}")
+
+        if total_updates is None and mode == "ajax":
+            print("ERRO: Modo AJAX solicitado, mas o endpoint do DataTables não pôde ser usado.")
+    if total_updates is None and mode != "ajax":
+        if mode == "auto":
+            print("Usando varredura por paginação como fallback...")
+        total_updates = scrape_via_pagination(page, writer, start_page, parser)
+    return total_updates
+
+class VigenciaIndex:
+    """
+    Recebe as linhas da listagem no lugar de um writer e monta um índice em memória
+    {codigo_gce: (ata, validade, valor)}. Quando o código tem mais de uma ata vigente,
+    fica a de validade mais longa.
+    """
+
+    def __init__(self):
+        self.atas = {}
+        self.stats = {"recebido": 0}
+
+    def add(self, updates, cursor=None):
+        self.stats["recebido"] += len(updates)
+        for validade, valor, codigo_gce, ata in updates:
+            current = self.atas.get(codigo_gce)
+            if current is None or validade > current[1]:
+                self.atas[codigo_gce] = (ata, validade, valor)
+
+def load_vigencia_index(context, page, mode=SCRAPE_MODE):
+    """
+    Abre a listagem de itens com ata vigente no contexto já autenticado e devolve o índice
+    {codigo_gce: (ata, validade, valor)}, ou None se a listagem não pôde ser lida por inteiro.
+    """
+    xhr_responses = []
+    if mode != "paginate":
+        page.on("response", lambda r: xhr_responses.append(r) if r.request.resource_type in ("xhr", "fetch") else None)
+
+    print(f"Carregando a listagem de atas vigentes: {TARGET_URL}")
+    index = VigenciaIndex()
+    try:
+        page.goto(TARGET_URL)
+        if scrape_listing(context, page, xhr_responses, index, mode) is None:
+            return None
+    except Exception as e:
+        print(f"AVISO: Falha ao ler a listagem de atas vigentes: {e}")
+        return None
+    print(f"Índice da listagem: {len(index.atas)} códigos com ata vigente ({index.stats['recebido']} linhas).")
+    return index.atas
+
+def scrape_atas(mode=SCRAPE_MODE, lean=LEAN, resume=False):
     if not all([ORG, MATRICULA, PASSWORD]):
         print("ERRO CRÍTICO: Credenciais GCE não encontradas.")
         return
@@ -73,175 +520,89 @@ def scrape_atas():
     try:
         conn = get_db_connection()
         print("Conexão com banco de dados estabelecida.")
+        ensure_schema(conn)
+        # Diário da execução: o cursor diz até onde a listagem já foi gravada ('ajax:<linha>' ou 'pagina:<n>')
+        run_id, resumed, cursor = start_run(conn, "scrape_atas_vigentes", resume, {"mode": mode})
+        # A unidade de latência do scrape é a página (ou bloco AJAX) da listagem
+        metrics.start("scrape_atas_vigentes", run_id, item_phase="pagina")
     except Exception as e:
         print(f"Erro ao conectar ao banco: {e}")
         return
 
+    ajax_start, start_page = 0, 1
+    if resumed and cursor:
+        kind, _, position = cursor.partition(":")
+        if kind == "ajax":
+            ajax_start = int(position)
+        elif kind == "pagina":
+            start_page = int(position) + 1
+
     with sync_playwright() as p:
-        is_headless = os.getenv("HEADLESS", "true").lower() == "true"
-        browser = p.chromium.launch(headless=is_headless)
-        context = browser.new_context()
-        page = context.new_page()
-
-        # --- LOGIN LOGIC (Reused) ---
-        print(f"Acessando página de login...")
-        page.goto(LOGIN_URL)
-        
-        try:
-            print("Aguardando carregamento...")
-            page.wait_for_selector("#login, #textoPesquisaItem", timeout=30000)
-            
-            if page.locator("#login").is_visible():
-                print("Realizando login...")
-                page.locator('input#login[placeholder="Organização"]').fill(ORG)
-                page.locator('input#matricula[placeholder="Matrícula"]').fill(MATRICULA)
-                
-                password_selector = 'input#password[placeholder="Senha"]'
-                page.wait_for_selector(password_selector, timeout=10000)
-                page.locator(password_selector).fill(PASSWORD)
-                
-                time.sleep(1)
-                page.click('#btnLogin')
-                page.wait_for_timeout(5000) # Wait for redirect
-                
-                # Verifica se logou
-                if page.locator("#login").is_visible():
-                     print("ERRO: Login falhou (ainda na tela de login).")
-                     browser.close()
-                     return
-                print("Login realizado.")
-            else:
-                 print("Já estava logado.")
+        browser = launch_browser(p)
 
-        except Exception as e:
-            print(f"Erro no login: {e}")
+        # --- LOGIN (sessão em cache compartilhada com update_atas.py) ---
+        traffic = TrafficMonitor(lean)
+        with metrics.phase("login"):
+            context, page = open_session(browser, LOGIN_URL, "#dtTodosItensAtaVigente", traffic)
+        if context is None:
             browser.close()
+            conn.close()
+            metrics.write("falha_login")
             return
 
         # --- NAVIGATE TO TARGET PAGE ---
+        # Registra as respostas XHR da listagem para poder reaproveitar a requisição do DataTables
+        xhr_responses = []
+        if mode != "paginate":
+            page.on("response", lambda r: xhr_responses.append(r) if r.request.resource_type in ("xhr", "fetch") else None)
+
         print(f"Navegando para: {TARGET_URL}")
-        page.goto(TARGET_URL)
-        
-        # --- SCRAPING BULK PROCESSING VIA PAGINATION ---
+        with metrics.phase("navegacao"):
+            page.goto(TARGET_URL)
+
+        # Os updates vão para o banco por uma fila enquanto a listagem ainda está sendo lida
+        writer = QueuedWriter(VigenciaWriter(conn, run_id=run_id))
+        failed = False
+        total_updates = None
         try:
-            print("Iniciando varredura com paginação...")
-            updates = []
-            page_num = 1
-            
-            while True:
-                print(f"--- Processando Página {page_num} ---")
-                
-                # Aguarda o aviso de "Processando..." sumir
-                processing_locator = page.locator("#dtTodosItensAtaVigente_processing")
-                if processing_locator.is_visible():
-                    processing_locator.wait_for(state="hidden", timeout=60000)
-                
-                time.sleep(1) # Extra stability for DataTables JS redraw
-                
-                # Vamos buscar todas as linhas rendered na página atual
-                rows = page.locator("table tbody tr").all()
-                print(f"Encontradas {len(rows)} linhas na página {page_num}.")
-                
-                for i, row in enumerate(rows):
-                    # Extrai texto bruto (células)
-                    cells = row.locator("td").all_text_contents()
-                    
-                    if len(cells) < 5: 
-                        continue
-
-                    codigo_gce = None
-                    
-                    # Encontra Codigo GCE formatado (ex: 0000.0000.000000)
-                    for cell in cells:
-                        cell = cell.strip()
-                        if re.match(r"^\d{4}\.\d{4}\.\d{6}$", cell):
-                            codigo_gce = cell
-                            break
-                            
-                    if not codigo_gce:
-                        continue
-                    
-                    # Coleta Validade do Final da Linha
-                    possible_date = cells[-1].strip()
-                    if re.match(r"^\d{2}/\d{2}/\d{4}$", possible_date):
-                        validade_str = possible_date
-                    else:
-                        dates = [c for c in cells if re.match(r"^\d{2}/\d{2}/\d{4}$", c.strip())]
-                        validade_str = dates[-1] if dates else None
-                        
-                    validade_db = parse_date(validade_str)
-                    
-                    # Coleta Valor (Money)
-                    money = [c for c in cells if "R$" in c or re.match(r"^\d+,\d{2}$", c.strip())]
-                    valor_db = None
-                    if money:
-                        valor_db = parse_currency(money[0])
-                        
-                    # Coleta Número da ATA ignorando Datas
-                    atas = [c for c in cells if "/" in c and not re.match(r"^\d{2}/\d{2}/\d{4}$", c.strip()) and len(c) < 20]
-                    ata_db = atas[0].strip() if atas else None
-                    
-                    if ata_db and validade_db:
-                        # Monta pacote (val, valUnitario, ident, ident) 
-                        updates.append((validade_db, valor_db, codigo_gce, ata_db))
-
-                # --- Paginação ---
-                # Acha o número da próxima página (ex: se estamos na 1, procura o botão "2").
-                # Isso é muito mais seguro do que um XPath absoluto (que pode quebrar) ou xpath fixo de posição a[2]
-                next_page_str = str(page_num + 1)
-                next_button = page.locator(f"xpath=//a[contains(@class, 'paginate_button') and text()='{next_page_str}']")
-                
-                # Se o botão não existir, ou se chegamos na última página e por algum motivo ele ficou invisível:
-                if next_button.count() == 0 or not next_button.first.is_visible():
-                    print(f"Fim da paginação (botão '{next_page_str}' não encontrado). Última página atingida: {page_num}")
-                    break
-                
-                # Clica na próxima página e aguarda a transição
-                print("Indo para a próxima página...")
-                next_button.click(force=True)
-                
-                # Espera 1s para o site acusar que está "processando" e volta ao loop, que aguardará o processando sumir
-                time.sleep(1)
-                
-                page_num += 1
-
-            # --- BULK Pushing para o BD ---
-            print(f"\nExtração concluída com sucesso! Varremos {page_num} páginas. Gerados {len(updates)} pacotes de atualização.")
-            print("Executando injeção em lote no banco local...")
-            
-            if updates:
-                total_updated = 0
-                cur = conn.cursor()
-                try:
-                    # Prepara a query de UPDATE
-                    query = """
-                        UPDATE items 
-                        SET validade_ata = %s, valor_unitario_ata = %s
-                        WHERE codigo_gce = %s AND ata = %s
-                    """
-                    
-                    # Vamos varrendo um por um e comittando ao final. 
-                    for update in updates:
-                        cur.execute(query, update)
-                        if cur.rowcount > 0:
-                            total_updated += int(cur.rowcount)
-                            
-                    conn.commit()
-                    print(f"==> OPERAÇÃO CONCLUÍDA: {total_updated} linhas efetivamente corrigidas e ativadas no banco local <==")
-                except Exception as db_err:
-                    print(f"Erro CRÍTICO no momento do commit em massa: {db_err}")
-                    conn.rollback()
-                finally:
-                    cur.close()
-            else:
-                print("Nenhum dado qualificado de Data ou ATA foi detectado para efetuar update nas listagens.")
-                
+            total_updates = scrape_listing(context, page, xhr_responses, writer, mode, ajax_start, start_page)
         except Exception as e:
             print(f"Erro na varredura HTML ou interação de paginação: {e}")
+            failed = True
+        finally:
+            print("Aguardando o banco gravar os últimos lotes...")
+            writer.close()
+
+        stats = writer.stats
+        if stats["recebido"]:
+            print(f"==> OPERAÇÃO CONCLUÍDA: {stats['atualizado']} linhas efetivamente corrigidas e ativadas no banco local "
+                  f"({stats['recebido']} pacotes recebidos, {stats['encontrado']} itens encontrados, "
+                  f"{stats['sem_correspondencia']} sem item correspondente, {stats['erro']} com erro) <==")
+        else:
+            print("Nenhum dado qualificado de Data ou ATA foi detectado para efetuar update nas listagens.")
+
+        # Execução com falha fica aberta no diário para ser retomada com --resume a partir do cursor
+        status = "interrompida" if failed or total_updates is None or stats["erro"] else "concluida"
+        finish_run(conn, run_id, status)
+        if status == "interrompida":
+            print(f"Execução {run_id} interrompida. Use --resume para continuar de onde parou.")
+        metrics.set_counters(stats)
+        metrics.write(status)
 
         if conn:
             conn.close()
         browser.close()
+        traffic.report()
 
 if __name__ == "__main__":
-    scrape_atas()
+    print("Script scrape_atas_vigentes.py iniciado...")
+    parser = argparse.ArgumentParser(description="Atualiza a validade das atas vigentes a partir da listagem do GCE.")
+    parser.add_argument("--mode", choices=["auto", "ajax", "paginate"], default=SCRAPE_MODE,
+                        help="auto: AJAX do DataTables com fallback para paginação (padrão: GCE_SCRAPE_MODE ou auto)")
+    parser.add_argument("--lean", action="store_true", default=LEAN,
+                        help="Perfil enxuto: bloqueia imagens, fontes, CSS e scripts de terceiros (padrão: GCE_LEAN)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Retoma a última execução interrompida a partir da posição já gravada")
+    args = parser.parse_args()
+
+    scrape_atas(args.mode, args.lean, args.resume)
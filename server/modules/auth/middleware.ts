@@ -1,5 +1,12 @@
 import { Request, Response, NextFunction } from "express";
 
+export const requireAuth = (req: Request, res: Response, next: NextFunction) => {
+    if (!req.isAuthenticated()) {
+        return res.status(401).json({ error: "Não autenticado." });
+    }
+    next();
+};
+
 export const requireAdmin = (req: Request, res: Response, next: NextFunction) => {
     // Debug logging to diagnose permission issues
     const user = req.user as any;
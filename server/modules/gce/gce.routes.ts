@@ -0,0 +1,112 @@
+import { Router } from "express";
+import { db } from "../../db";
+import { gceJobs, gceAlteracoes, items } from "@shared/schema";
+import { and, eq, desc, sql } from "drizzle-orm";
+import { z } from "zod";
+import { requireAdmin, requireAuth } from "../auth/middleware";
+import { handleRouteError } from "../../lib/errors";
+
+// Pedidos de atualização para o worker residente do GCE (gce_worker.py).
+// O pedido é gravado em gce_jobs e o worker é avisado pelo canal "gce_jobs" (NOTIFY).
+const router = Router();
+
+const JOBS_CHANNEL = "gce_jobs";
+const codigoGceSchema = z.string().trim().regex(/^\d{4}\.\d{4}\.\d{6}$/, "Código GCE inválido");
+const refreshSchema = z.object({
+    codigos: z.array(codigoGceSchema).min(1).max(50),
+});
+
+// Um pedido igual (mesmo tipo, códigos e parâmetros) ainda pendente é reaproveitado em vez de duplicado
+async function enqueueJob(tipo: string, codigos: string[], parametros: Record<string, unknown> = {}) {
+    const codigosJson = JSON.stringify(Array.from(new Set(codigos)).sort());
+    const parametrosJson = JSON.stringify(parametros);
+    return db.transaction(async (tx) => {
+        // Serializa os pedidos concorrentes para que dois cliques seguidos não criem dois pedidos
+        await tx.execute(sql`SELECT pg_advisory_xact_lock(hashtext(${JOBS_CHANNEL}))`);
+        const [pending] = await tx
+            .select()
+            .from(gceJobs)
+            .where(and(
+                eq(gceJobs.status, "pendente"),
+                eq(gceJobs.tipo, tipo),
+                eq(gceJobs.codigos, codigosJson),
+                eq(gceJobs.parametros, parametrosJson),
+            ))
+            .limit(1);
+        if (pending) {
+            return pending;
+        }
+        const [job] = await tx
+            .insert(gceJobs)
+            .values({ tipo, codigos: codigosJson, parametros: parametrosJson })
+            .returning();
+        // O NOTIFY só é entregue no commit, junto com o pedido
+        await tx.execute(sql`SELECT pg_notify(${JOBS_CHANNEL}, ${job.id})`);
+        return job;
+    });
+}
+
+// Atualiza na hora um ou mais códigos (ex: botão "Atualizar do GCE" no item)
+router.post("/refresh", requireAuth, async (req, res) => {
+    try {
+        const { codigos } = refreshSchema.parse(req.body);
+        const job = await enqueueJob("codigos", codigos);
+        res.status(202).json(job);
+    } catch (error) {
+        if (error instanceof z.ZodError) {
+            return res.status(400).json({ error: error.errors });
+        }
+        handleRouteError(res, error, "Failed to enqueue GCE refresh");
+    }
+});
+
+// Varredura completa de todos os itens (a mesma do cron, fora do horário agendado)
+router.post("/refresh/completo", requireAdmin, async (req, res) => {
+    try {
+        const job = await enqueueJob("completo", [], { full: req.body?.full !== false });
+        res.status(202).json(job);
+    } catch (error) {
+        handleRouteError(res, error, "Failed to enqueue GCE sweep");
+    }
+});
+
+// Acompanhamento do pedido: status e, ao final, o resultado de cada código
+router.get("/refresh/:id", async (req, res) => {
+    try {
+        const [job] = await db.select().from(gceJobs).where(eq(gceJobs.id, req.params.id));
+        if (!job) {
+            return res.status(404).json({ error: "Pedido não encontrado" });
+        }
+        res.json({ ...job, resultado: job.resultado ? JSON.parse(job.resultado) : null });
+    } catch (error) {
+        handleRouteError(res, error, "Failed to fetch GCE refresh");
+    }
+});
+
+// Últimas alterações gravadas pelos scripts (ata renovada, preço alterado), para o painel
+router.get("/alteracoes", async (req, res) => {
+    try {
+        const limit = Math.min(Math.max(parseInt(String(req.query.limit ?? "100")) || 100, 1), 500);
+        const alteracoes = await db
+            .select({
+                id: gceAlteracoes.id,
+                itemId: gceAlteracoes.itemId,
+                itemNome: items.itemNome,
+                setor: items.setor,
+                codigoGce: gceAlteracoes.codigoGce,
+                campo: gceAlteracoes.campo,
+                valorAnterior: gceAlteracoes.valorAnterior,
+                valorNovo: gceAlteracoes.valorNovo,
+                alteradoEm: gceAlteracoes.alteradoEm,
+            })
+            .from(gceAlteracoes)
+            .leftJoin(items, eq(items.id, gceAlteracoes.itemId))
+            .orderBy(desc(gceAlteracoes.alteradoEm))
+            .limit(limit);
+        res.json(alteracoes);
+    } catch (error) {
+        handleRouteError(res, error, "Failed to fetch GCE changes");
+    }
+});
+
+export const gceRoutes = router;
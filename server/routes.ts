@@ -8,6 +8,7 @@ import { authRoutes } from "./modules/auth/auth.routes";
 import { managementRoutes } from "./modules/auth/management.routes";
 import { responsaveisRoutes } from "./modules/responsaveis/responsaveis.routes";
 import { glpiRoutes } from "./modules/glpi/glpi.routes";
+import { gceRoutes } from "./modules/gce/gce.routes";
 
 export async function registerRoutes(
   httpServer: Server,
@@ -24,6 +25,7 @@ export async function registerRoutes(
   app.use("/api/management", managementRoutes);
   app.use("/api/glpi", glpiRoutes);
   app.use("/api/responsaveis", responsaveisRoutes);
+  app.use("/api/gce", gceRoutes);
 
 
   return httpServer;
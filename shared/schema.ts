@@ -1,5 +1,5 @@
 import { sql } from "drizzle-orm";
-import { pgTable, text, integer, doublePrecision, boolean, timestamp, uuid } from "drizzle-orm/pg-core";
+import { pgTable, text, integer, doublePrecision, boolean, timestamp, uuid, primaryKey, index } from "drizzle-orm/pg-core";
 import { createInsertSchema } from "drizzle-zod";
 import { z } from "zod";
 import { relations } from "drizzle-orm";
@@ -73,7 +73,10 @@ export const items = pgTable("items", {
   observacoes: text("observacoes"),
   imagemUrl: text("imagem_url"),
   ativo: boolean("ativo").notNull().default(true),
-});
+}, (table) => ({
+  // Casamento da listagem de atas vigentes do GCE (criado também por gce_db.ensure_schema)
+  codigoGceAtaIdx: index("items_codigo_gce_ata_idx").on(table.codigoGce, table.ata),
+}));
 
 export const movimentos = pgTable("movimentos", {
   id: text("id").primaryKey().$defaultFn(() => uuidv4()),
@@ -159,3 +162,68 @@ export const insertUserSchema = createInsertSchema(users).pick({
 
 export type InsertUser = z.infer<typeof insertUserSchema>;
 export type User = typeof users.$inferSelect;
+
+// Última consulta de cada Código GCE feita pelos scripts Python (update_atas.py).
+// Base da política de atualização incremental; a tabela é criada pelo próprio script (gce_db.ensure_schema).
+export const gceConsultas = pgTable("gce_consultas", {
+  codigoGce: text("codigo_gce").primaryKey(),
+  consultadoEm: timestamp("consultado_em").notNull().defaultNow(),
+  resultado: text("resultado").notNull(),
+});
+
+export type GceConsulta = typeof gceConsultas.$inferSelect;
+
+// Diário de execuções dos scripts Python do GCE, usado para retomar execuções interrompidas (--resume).
+export const gceExecucoes = pgTable("gce_execucoes", {
+  id: text("id").primaryKey(),
+  script: text("script").notNull(),
+  status: text("status").notNull().default("em_andamento"),
+  cursor: text("cursor"), // Posição na listagem (scrape_atas_vigentes.py): 'ajax:<linha>' ou 'pagina:<n>'
+  parametros: text("parametros"),
+  iniciadaEm: timestamp("iniciada_em").notNull().defaultNow(),
+  atualizadaEm: timestamp("atualizada_em").notNull().defaultNow(),
+  finalizadaEm: timestamp("finalizada_em"),
+});
+
+export const gceExecucaoItens = pgTable("gce_execucao_itens", {
+  execucaoId: text("execucao_id").notNull().references(() => gceExecucoes.id, { onDelete: "cascade" }),
+  itemId: text("item_id").notNull(),
+}, (table) => ({
+  pk: primaryKey({ columns: [table.execucaoId, table.itemId] }),
+}));
+
+export type GceExecucao = typeof gceExecucoes.$inferSelect;
+
+// Fila de pedidos de atualização do worker residente do GCE (gce_worker.py), criada por gce_db.ensure_schema.
+// O servidor enfileira um pedido e avisa o worker com NOTIFY no canal "gce_jobs".
+export const gceJobs = pgTable("gce_jobs", {
+  id: text("id").primaryKey().$defaultFn(() => uuidv4()),
+  tipo: text("tipo").notNull(), // 'codigos' (lista de Códigos GCE) ou 'completo' (varredura de todos os itens)
+  codigos: text("codigos"), // JSON: ["0000.0000.000000", ...]
+  parametros: text("parametros"), // JSON: { "full": true } na varredura completa
+  status: text("status").notNull().default("pendente"), // pendente, em_andamento, concluido, falha
+  resultado: text("resultado"), // JSON com o status de cada código ou o resumo da varredura
+  solicitadoEm: timestamp("solicitado_em").notNull().defaultNow(),
+  iniciadoEm: timestamp("iniciado_em"),
+  finalizadoEm: timestamp("finalizado_em"),
+});
+
+export type GceJob = typeof gceJobs.$inferSelect;
+
+// Histórico das alterações gravadas pelos scripts do GCE em items (uma linha por campo alterado),
+// criado por gce_db.ensure_schema. Datas em 'AAAA-MM-DD' e valores numéricos sem zeros à direita.
+export const gceAlteracoes = pgTable("gce_alteracoes", {
+  id: text("id").primaryKey().$defaultFn(() => uuidv4()),
+  itemId: text("item_id").notNull(),
+  codigoGce: text("codigo_gce"),
+  campo: text("campo").notNull(), // item_nome, ata, validade_ata, valor_unitario_ata, validade_valor_referencia, valor_unitario_referencia
+  valorAnterior: text("valor_anterior"),
+  valorNovo: text("valor_novo"),
+  execucaoId: text("execucao_id"),
+  alteradoEm: timestamp("alterado_em").notNull().defaultNow(),
+}, (table) => ({
+  alteradoEmIdx: index("gce_alteracoes_alterado_em_idx").on(table.alteradoEm),
+  itemIdIdx: index("gce_alteracoes_item_id_idx").on(table.itemId),
+}));
+
+export type GceAlteracao = typeof gceAlteracoes.$inferSelect;
@@ -0,0 +1,36 @@
+import os
+import sys
+import json
+import tempfile
+import unittest
+import subprocess
+
+# Smoke test de ponta a ponta: roda benchmark_gce.py (login, busca, detalhe e listagem) contra o
+# servidor simulado e um banco descartável. Precisa do Chromium do Playwright e de GCE_TEST_DB_NAME.
+TEST_DB_NAME = os.getenv("GCE_TEST_DB_NAME")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@unittest.skipUnless(TEST_DB_NAME, "GCE_TEST_DB_NAME não definido")
+class BenchmarkSmokeTest(unittest.TestCase):
+    def test_update_and_scrape_against_stub(self):
+        if TEST_DB_NAME == os.getenv("DB_NAME"):
+            self.skipTest("GCE_TEST_DB_NAME não pode ser o banco da aplicação")
+        items, missing = 8, 2
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, "bench.json")
+            proc = subprocess.run([
+                sys.executable, os.path.join(ROOT, "benchmark_gce.py"), "--db-name", TEST_DB_NAME,
+                "--items", str(items), "--missing", str(missing), "--latency-ms", "0", "--jitter-ms", "0",
+                "--port", os.getenv("GCE_TEST_STUB_PORT", "8799"), "--json", out,
+            ], cwd=tmp, capture_output=True, text=True, timeout=600)
+            self.assertEqual(proc.returncode, 0, proc.stdout[-2000:] + proc.stderr[-2000:])
+            with open(out, encoding="utf-8") as f:
+                results = {r["script"]: r for r in json.load(f)}
+
+        # Uma latência por código consultado: falha se o login ou a busca não funcionarem
+        self.assertEqual(results["update_atas"]["amostras_latencia"], items + missing, proc.stdout[-2000:])
+        self.assertGreater(results["update_atas"]["paginas"], 0)
+        self.assertGreater(results["scrape_atas"]["itens"], 0, proc.stdout[-2000:])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import unittest
+from datetime import date, datetime
+from decimal import Decimal
+import psycopg2
+import gce_db
+from gce_db import normalize_value, ensure_schema, AtaWriter
+from benchmark_gce import ensure_items_table
+
+# Os testes que gravam no banco usam um banco descartável, nunca o DB_NAME da aplicação:
+# GCE_TEST_DB_NAME (com DB_HOST, DB_PORT, DB_USER e DB_PASS do ambiente). Sem ele, são ignorados.
+TEST_DB_NAME = os.getenv("GCE_TEST_DB_NAME")
+TEST_PREFIX = "test-"
+
+class NormalizeValueTest(unittest.TestCase):
+    def test_dates(self):
+        self.assertEqual(normalize_value("validade_ata", datetime(2025, 8, 23, 10, 30)), "2025-08-23")
+        self.assertEqual(normalize_value("validade_ata", date(2025, 8, 23)), "2025-08-23")
+        self.assertEqual(normalize_value("validade_ata", "2025-08-23T00:00:00"), "2025-08-23")
+
+    def test_numbers(self):
+        self.assertEqual(normalize_value("valor_unitario_ata", Decimal("2315.3100")), "2315.31")
+        self.assertEqual(normalize_value("valor_unitario_ata", 2315.31), "2315.31")
+        self.assertEqual(normalize_value("valor_unitario_ata", "100"), "100")
+        self.assertEqual(normalize_value("valor_unitario_ata", Decimal("1E+2")), "100")
+        self.assertEqual(normalize_value("valor_unitario_ata", "abc"), "abc")
+
+    def test_text_and_empty(self):
+        self.assertEqual(normalize_value("ata", " 12/2025 "), "12/2025")
+        self.assertIsNone(normalize_value("ata", "   "))
+        self.assertIsNone(normalize_value("valor_unitario_ata", None))
+
+@unittest.skipUnless(TEST_DB_NAME, "GCE_TEST_DB_NAME não definido")
+class AtaWriterTest(unittest.TestCase):
+    def setUp(self):
+        if TEST_DB_NAME == os.getenv("DB_NAME"):
+            self.skipTest("GCE_TEST_DB_NAME não pode ser o banco da aplicação")
+        self.conn = psycopg2.connect(host=gce_db.DB_HOST, port=gce_db.DB_PORT, database=TEST_DB_NAME,
+                                     user=gce_db.DB_USER, password=gce_db.DB_PASS)
+        ensure_items_table(self.conn)
+        ensure_schema(self.conn)
+        self.cleanup()
+        cur = self.conn.cursor()
+        cur.executemany("INSERT INTO items (id, setor, codigo_gce, item_nome) VALUES (%s, %s, %s, %s)",
+                        [(f"{TEST_PREFIX}{i}", "SETOR", f"8000.0000.{i:06d}", f"ITEM {i}") for i in range(6)])
+        self.conn.commit()
+        cur.close()
+
+    def tearDown(self):
+        self.cleanup()
+        self.conn.close()
+
+    def cleanup(self):
+        cur = self.conn.cursor()
+        cur.execute("DELETE FROM gce_alteracoes WHERE item_id LIKE %s", (f"{TEST_PREFIX}%",))
+        cur.execute("DELETE FROM items WHERE id LIKE %s", (f"{TEST_PREFIX}%",))
+        cur.execute("DELETE FROM gce_consultas WHERE codigo_gce LIKE '8000.%%'")
+        self.conn.commit()
+        cur.close()
+
+    def fetch(self, column):
+        cur = self.conn.cursor()
+        cur.execute(f"SELECT id, {column} FROM items WHERE id LIKE %s ORDER BY id", (f"{TEST_PREFIX}%",))
+        rows = dict(cur.fetchall())
+        cur.close()
+        return rows
+
+    def test_failed_batch_is_split_until_only_the_bad_code_is_left_out(self):
+        writer = AtaWriter(self.conn, batch_size=100)
+        for i in range(6):
+            # O valor do item 3 não é numérico: o UPDATE do lote inteiro falha no cast
+            valor = "abc" if i == 3 else f"{i}.50"
+            writer.add(f"{TEST_PREFIX}{i}", f"8000.0000.{i:06d}", ata=f"{i}/2025", validade_ata="2026-12-31",
+                       valor_unitario_ata=valor)
+        writer.close()
+
+        atas = self.fetch("ata")
+        self.assertIsNone(atas[f"{TEST_PREFIX}3"])
+        self.assertEqual({item_id: ata for item_id, ata in atas.items() if item_id != f"{TEST_PREFIX}3"},
+                         {f"{TEST_PREFIX}{i}": f"{i}/2025" for i in (0, 1, 2, 4, 5)})
+        self.assertEqual(writer.stats, {"atualizado": 5, "sem_alteracao": 0, "erro": 1})
+
+    def test_unchanged_items_are_not_rewritten(self):
+        writer = AtaWriter(self.conn, batch_size=100)
+        writer.add(f"{TEST_PREFIX}0", "8000.0000.000000", ata="1/2025", validade_ata="2026-12-31", valor_unitario_ata="10.00")
+        writer.close()
+        again = AtaWriter(self.conn, batch_size=100)
+        again.add(f"{TEST_PREFIX}0", "8000.0000.000000", ata="1/2025", validade_ata="2026-12-31", valor_unitario_ata=10)
+        again.close()
+        self.assertEqual(again.stats, {"atualizado": 0, "sem_alteracao": 1, "erro": 0})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import gce_metrics
+from gce_metrics import percentile, merge_reports
+
+class PercentileTest(unittest.TestCase):
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([3.0], 95), 3.0)
+        self.assertIsNone(percentile([], 50))
+
+class MergeReportsTest(unittest.TestCase):
+    def setUp(self):
+        # O relatório juntado é gravado em METRICS_DIR: aponta para um diretório temporário
+        self.dir = tempfile.mkdtemp(prefix="gce_metrics_test_")
+        self.saved_dirs = gce_metrics.METRICS_DIR, gce_metrics.PROM_TEXTFILE_DIR
+        gce_metrics.METRICS_DIR = gce_metrics.PROM_TEXTFILE_DIR = self.dir
+
+    def tearDown(self):
+        gce_metrics.METRICS_DIR, gce_metrics.PROM_TEXTFILE_DIR = self.saved_dirs
+        shutil.rmtree(self.dir)
+
+    def write_shard(self, index, total, started, status="concluida", coletado=1, samples=(1.0,)):
+        report = {
+            "script": "teste", "execucao_id": f"run-{index}", "status": status, "shard": [index, total],
+            "inicio_ts": started, "fim_ts": started + 60, "contadores": {"coletado": coletado},
+            "amostras": {"fases": {"busca": list(samples)}, "itens": list(samples)},
+        }
+        with open(os.path.join(self.dir, f"gce_teste_shard{index}-{total}.json"), "w", encoding="utf-8") as f:
+            json.dump(report, f)
+
+    def test_sums_counters_and_pools_samples(self):
+        now = time.time()
+        self.write_shard(1, 2, now, coletado=3, samples=(1.0, 2.0))
+        self.write_shard(2, 2, now + 5, coletado=4, samples=(3.0,))
+        summary = merge_reports("teste")
+        self.assertEqual(summary["status"], "concluida")
+        self.assertEqual(summary["contadores"], {"coletado": 7})
+        self.assertEqual(summary["latencia_item"]["quantidade"], 3)
+        self.assertEqual(summary["latencia_item"]["max_s"], 3.0)
+        self.assertEqual(summary["duracao_s"], 65)
+        self.assertTrue(os.path.exists(os.path.join(self.dir, "gce_teste.prom")))
+
+    def test_missing_or_failed_shard_marks_run_interrupted(self):
+        now = time.time()
+        self.write_shard(1, 3, now)
+        self.write_shard(2, 3, now, status="interrompida")
+        self.assertEqual(merge_reports("teste")["status"], "interrompida")
+
+    def test_ignores_reports_from_an_earlier_sweep(self):
+        now = time.time()
+        self.write_shard(1, 2, now, coletado=3)
+        self.write_shard(2, 2, now - (gce_metrics.SHARD_MERGE_WINDOW_HOURS + 1) * 3600, coletado=100)
+        summary = merge_reports("teste")
+        self.assertEqual(summary["contadores"], {"coletado": 3})
+        self.assertEqual(summary["status"], "interrompida")
+
+    def test_no_reports(self):
+        self.assertIsNone(merge_reports("teste"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from scrape_atas_vigentes import build_column_map, json_value_to_cell, RowParser
+
+HEADERS = ["Nº Ata", "Código GCE", "Descrição", "Valor Unitário", "Início Vigência", "Fim Vigência"]
+
+class BuildColumnMapTest(unittest.TestCase):
+    def test_maps_fields_by_header(self):
+        self.assertEqual(build_column_map(["Código", "Ata", "Validade", "Valor"]),
+                         {"codigo_gce": 0, "ata": 1, "validade": 2, "valor": 3})
+
+    def test_validade_prefers_end_of_term_column(self):
+        self.assertEqual(build_column_map(HEADERS)["validade"], 5)
+        self.assertEqual(build_column_map(["Código", "Ata", "Fim Vigência", "Início Vigência", "Valor"])["validade"], 2)
+
+    def test_unrecognized_header_returns_none(self):
+        self.assertIsNone(build_column_map(["Código", "Ata", "Valor"]))
+
+class RowParserTest(unittest.TestCase):
+    def test_parses_by_position(self):
+        parser = RowParser.from_headers(HEADERS)
+        row = ["12/2025", "1234.5678.000001", "CANETA", "2.315,31", "01/01/2025", "31/12/2025 00:00:00"]
+        self.assertEqual(parser.parse(row), ("2025-12-31", 2315.31, "1234.5678.000001", "12/2025"))
+
+    def test_counts_rejected_rows_by_reason(self):
+        parser = RowParser.from_headers(HEADERS)
+        rows = [
+            ["12/2025", "123", "CANETA", "1,00", "01/01/2025", "31/12/2025"],
+            ["", "1234.5678.000001", "CANETA", "1,00", "01/01/2025", "31/12/2025"],
+            ["12/2025", "1234.5678.000001", "CANETA", "1,00", "01/01/2025", "sem data"],
+            ["12/2025"],
+        ]
+        self.assertEqual(parser.parse_all(rows), [])
+        self.assertEqual(parser.rejected, {"codigo_invalido": 1, "sem_ata": 1, "validade_invalida": 1,
+                                           "colunas_insuficientes": 1})
+
+    def test_heuristic_without_header(self):
+        parser = RowParser.from_headers(None)
+        row = ["12/2025", "1234.5678.000001", "CANETA", "R$ 10,50", "31/12/2025"]
+        self.assertEqual(parser.parse(row), ("2025-12-31", 10.5, "1234.5678.000001", "12/2025"))
+
+class JsonValueToCellTest(unittest.TestCase):
+    def test_converts_datatables_values(self):
+        self.assertEqual(json_value_to_cell("/Date(1767139200000)/"), "31/12/2025")
+        self.assertEqual(json_value_to_cell("2025-08-23T00:00:00"), "23/08/2025")
+        self.assertEqual(json_value_to_cell(2315.31), "2315,31")
+        self.assertEqual(json_value_to_cell(None), "")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+from update_atas import parse_shard, shard_of, group_by_codigo
+
+class ShardTest(unittest.TestCase):
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("2/4"), (2, 4))
+        self.assertIsNone(parse_shard(None))
+        self.assertIsNone(parse_shard(""))
+        for invalid in ("0/4", "5/4", "1/0", "2", "a/b"):
+            with self.assertRaises(ValueError):
+                parse_shard(invalid)
+
+    def test_shard_of_is_stable_and_covers_every_slice(self):
+        codigos = [f"9000.0000.{i:06d}" for i in range(400)]
+        slices = [shard_of(codigo, 4) for codigo in codigos]
+        self.assertEqual(set(slices), {1, 2, 3, 4})
+        # O código é normalizado: espaços não mudam a fatia
+        self.assertEqual(shard_of(f" {codigos[0]} ", 4), slices[0])
+        # CRC32 e não hash(): a fatia não muda entre processos nem entre máquinas
+        self.assertEqual(slices[:3], [4, 2, 4])
+
+class GroupByCodigoTest(unittest.TestCase):
+    def test_groups_item_ids_by_trimmed_code(self):
+        rows = [("a", "1234.5678.000001"), ("b", "1234.5678.000002"), ("c", " 1234.5678.000001 ")]
+        self.assertEqual(dict(group_by_codigo(rows)), {"1234.5678.000001": ["a", "c"], "1234.5678.000002": ["b"]})
+
+if __name__ == "__main__":
+    unittest.main()
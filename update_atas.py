@@ -1,291 +1,583 @@
 import os
-import time
 import re
-import psycopg2
+import time
+import zlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from playwright.sync_api import sync_playwright
 from dotenv import load_dotenv
+from gce_session import BASE_URL, LEAN, TrafficMonitor, launch_browser, new_context, open_session
+from gce_wait import wait_for_selector, wait_for_item_detail, wait_for_search_result
+from gce_extract import extract_fields, extract_first_row
+from gce_journal import start_run, load_done_items, finish_run
+from gce_db import DB_NAME, DB_USER, DB_PASS, get_db_connection, ensure_schema, load_current_values, AtaWriter, QueuedWriter
+from gce_metrics import metrics, merge_reports
+from scrape_atas_vigentes import load_vigencia_index
 
 # Carrega variáveis de ambiente
 load_dotenv()
-print("Script update_atas.py iniciado...")
 
 # GCE Credentials
 ORG = os.getenv("GCE_ORG")
 MATRICULA = os.getenv("GCE_MATRICULA")
 PASSWORD = os.getenv("GCE_PASSWORD")
-SEARCH_URL = "https://gce.intra.rs.gov.br/Itens/Solicitacao/ConsultaGeralItens"
-
-# Database Credentials
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = os.getenv("DB_NAME")
-DB_USER = os.getenv("DB_USER")
-DB_PASS = os.getenv("DB_PASS")
-
-def get_db_connection():
-    return psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASS
-    )
-
-def update_atas():
+SEARCH_URL = f"{BASE_URL}/Itens/Solicitacao/ConsultaGeralItens"
+
+# Quantidade de navegadores trabalhando em paralelo (1 = modo serial original)
+WORKERS = int(os.getenv("GCE_WORKERS", "1"))
+
+# Política de atualização incremental: um item só é consultado novamente se a última consulta
+# tiver mais de MAX_AGE_DAYS dias ou se a ata/valor de referência vencer em até EXPIRY_WINDOW_DAYS dias
+MAX_AGE_DAYS = int(os.getenv("GCE_MAX_AGE_DAYS", "30"))
+EXPIRY_WINDOW_DAYS = int(os.getenv("GCE_EXPIRY_WINDOW_DAYS", "30"))
+
+# Prioridade: itens com movimentação nos últimos RECENT_MOVEMENT_DAYS dias passam à frente dos demais
+RECENT_MOVEMENT_DAYS = int(os.getenv("GCE_RECENT_MOVEMENT_DAYS", "30"))
+# Tempo máximo da execução em minutos (0 = sem limite): ao esgotar, os códigos restantes ficam para a próxima
+TIME_BUDGET_MINUTES = float(os.getenv("GCE_TIME_BUDGET_MINUTES", "0"))
+
+# Detecção de código inexistente: após o Enter aguarda a resposta da busca (requisição cuja URL contém
+# SEARCH_RESPONSE_PATTERN, o endpoint de pesquisa do portal). O código só é dado como inexistente (e vai
+# para o cache negativo) com um sinal explícito: a resposta sem resultados ou o aviso NO_RESULT_SELECTOR.
+# Se em SEARCH_RENDER_MS nenhum resultado trouxer o código, conta como sem resposta e é tentado de novo.
+SEARCH_RESPONSE_PATTERN = os.getenv("GCE_SEARCH_RESPONSE_PATTERN", "PesquisarItens")
+SEARCH_RENDER_MS = int(os.getenv("GCE_SEARCH_RENDER_MS", "3000"))
+# Opcional: seletor do aviso de "nenhum resultado" do portal, que encerra a espera assim que aparece
+NO_RESULT_SELECTOR = os.getenv("GCE_NO_RESULT_SELECTOR") or None
+# Cache negativo: um código que o portal confirmou não existir só volta a ser consultado após N dias
+NEGATIVE_TTL_DAYS = int(os.getenv("GCE_NEGATIVE_TTL_DAYS", "7"))
+
+# Divisão da execução entre processos/containers: "i/N" processa só a fatia i (1 a N) dos códigos
+SHARD = os.getenv("GCE_SHARD")
+
+# Modo combinado: lê antes a listagem de atas vigentes e usa o detalhe do item só para o que ela não traz
+COMBINED = os.getenv("GCE_COMBINED", "false").lower() == "true"
+
+def process_item(page, writer, item_ids, codigo_gce, prefix="", ata_listagem=None):
+    """
+    Consulta um código no GCE e entrega o resultado ao writer, que grava no banco em lotes
+    para todos os itens em item_ids (os itens de cada setor que compartilham o código).
+    ata_listagem (ata, validade, valor) vem do índice da listagem de atas vigentes; quando
+    informada, a tabela de atas do item não é aberta.
+    Retorna o status da coleta: 'coletado', 'invalido', 'nao_encontrado' (o portal respondeu que não
+    há resultado), 'sem_resposta' (nem resultado nem "nenhum resultado" dentro do timeout) ou 'erro'.
+    """
+    print(f"\n{prefix}--- Processando Item GCE: {codigo_gce} ({len(item_ids)} item(ns)) ---")
+
+    # Variáveis para coleta de dados
+    ata_num = None
+    validade_ata = None
+    valor_unitario_ata = None
+    valor_unitario_referencia = None
+    validade_valor_referencia = None
+
+    try:
+        # 0. Valida o formato do código GCE
+        if not codigo_gce or not re.match(r"^\d{4}\.\d{4}\.\d{6}$", str(codigo_gce).strip()):
+            print(f"{prefix}Ignorando item '{codigo_gce}': Formato inválido.")
+            return "invalido"
+
+        # Navega para a tela de busca
+        with metrics.phase("navegacao"):
+            page.goto(SEARCH_URL)
+
+            # Aguarda o campo de pesquisa estar pronto
+            wait_for_selector(page, "#textoPesquisaItem", "tela de busca", timeout=10000, prefix=prefix)
+
+        with metrics.phase("busca"):
+            # 1. Busca o código GCE
+            print(f"{prefix}Pesquisando código {codigo_gce}...")
+            search_input = page.locator("#textoPesquisaItem")
+            search_input.fill(str(codigo_gce))
+
+            # 2. Pesquisa, aguarda a resposta do portal e o resultado (ou a falta dele) e dá clique duplo
+            try:
+                result = wait_for_search_result(page, codigo_gce, lambda: page.keyboard.press("Enter"),
+                                                SEARCH_RESPONSE_PATTERN, NO_RESULT_SELECTOR, timeout=15000,
+                                                render_timeout=SEARCH_RENDER_MS, prefix=prefix)
+                if result == "vazio":
+                    print(f"{prefix}AVISO: Código {codigo_gce} não encontrado no GCE.")
+                    return "nao_encontrado"
+                if result == "sem_resposta":
+                    print(f"{prefix}AVISO: A busca por {codigo_gce} respondeu, mas o resultado não apareceu a tempo.")
+                    return "sem_resposta"
+
+                print(f"{prefix}Item encontrado. Abrindo detalhes...")
+                page.locator(f"li:has-text('{codigo_gce}')").first.dblclick()
+            except:
+                print(f"{prefix}AVISO: Item {codigo_gce} não apareceu ou erro ao clicar.")
+                return "sem_resposta"
+
+        # Aguarda o detalhe ser preenchido em vez de uma pausa fixa
+        with metrics.phase("detalhe"):
+            try:
+                wait_for_item_detail(page, prefix=prefix)
+                detail_ready = True
+            except Exception:
+                print(f"{prefix}AVISO: Detalhe do item {codigo_gce} demorou a carregar.")
+                detail_ready = False
+
+        # Lê todos os campos do detalhe em uma única chamada ao navegador
+        with metrics.phase("extracao"):
+            detail = extract_fields(page)
+            if detail["ata_vigente"] is None:
+                if not detail_ready:
+                    # O detalhe já esgotou o timeout: uma segunda espera pelo campo só atrasaria o erro
+                    print(f"{prefix}ERRO: Detalhe do item {codigo_gce} não carregou.")
+                    return "erro"
+                # O campo de ata vigente é obrigatório: dá mais uma chance ao detalhe antes de desistir
+                wait_for_selector(page, "#ItemAtaVigente", "ata vigente", timeout=15000, prefix=prefix)
+                detail = extract_fields(page)
+
+        # 2.A. Nome do Modificador (Nome Real do Item)
+        # O usuário pediu para ler o value do input #NomeModificador após abrir os detalhes
+        item_nome_real = detail["nome"]
+        if item_nome_real:
+            print(f"{prefix}Nome do Item detectado: {item_nome_real}")
+        elif item_nome_real is None:
+            print(f"{prefix}AVISO: Não foi possível ler o NomeModificador: campo ausente.")
+        else:
+            print(f"{prefix}AVISO: Campo NomeModificador vazio.")
+
+        # 3. Validade do Valor de Referência (comum a todos os casos)
+        raw_val = detail["validade_referencia"]
+        try:
+            if raw_val and "/" in raw_val:
+                # Formato: "23/08/2025 00:00:00" -> "2025-08-23"
+                d, m, rest = raw_val.split("/")
+                y = rest.split(" ")[0]
+                validade_valor_referencia = f"{y}-{m}-{d}"
+        except Exception as e:
+            print(f"{prefix}DEBUG: Não foi possível capturar validade de referência: {e}")
+
+        # 4. Valor Unitário de Referência (comum a todos os casos)
+        try:
+            # Converte formato brasileiro (ex: 2.315,31) para SQL (2315.31)
+            valor_unitario_referencia = detail["valor_referencia"].replace(".", "").replace(",", ".")
+            valor_unitario_referencia = float(valor_unitario_referencia)
+            valor_unitario_referencia = round(valor_unitario_referencia, 2)
+        except Exception as e:
+            valor_unitario_referencia = None
+            print(f"{prefix}DEBUG: Não foi possível capturar valor de referência: {e}")
+
+        # 5. Verifica se há Ata Vigente
+        ata_vigente = detail["ata_vigente"]
+        print(f"{prefix}Ata Vigente? {ata_vigente}")
+
+        if ata_listagem:
+            ata_num, validade_ata, valor_unitario_ata = ata_listagem
+            print(f"{prefix}Ata obtida da listagem de atas vigentes.")
+        elif ata_vigente == "Sim":
+            print(f"{prefix}Consultando Atas Vigentes...")
+
+            # Extrai detalhes da tabela de Atas
+            try:
+                # Espera a tabela carregar e pega a primeira linha de dados
+                with metrics.phase("atas"):
+                    page.click("#btnAtasVigentes")
+                    wait_for_selector(page, "tr.odd, tr.even", "tabela de atas", timeout=12000, prefix=prefix)
+                    cells = extract_first_row(page, "tr.odd, tr.even") or []
+
+                if len(cells) >= 5:
+                    ata_num = cells[0].strip()
+                    validade_ata_raw = cells[2].strip()
+                    valor_unitario_raw = cells[4].strip()
+
+                    # Converte data brasileira (DD/MM/YYYY) para ISO (YYYY-MM-DD)
+                    try:
+                        d, m, y = validade_ata_raw.split("/")
+                        validade_ata = f"{y}-{m}-{d}"
+                    except Exception as e:
+                        print(f"{prefix}AVISO: Falha ao converter data '{validade_ata_raw}': {e}")
+                        validade_ata = None # Define como None se falhar
+
+                    # Converte formato brasileiro (ex: 2.315,31) para SQL (2315.31)
+                    valor_unitario_ata = valor_unitario_raw.replace(".", "").replace(",", ".")
+                else:
+                    print(f"{prefix}AVISO: Linha da tabela de atas para {codigo_gce} incompleta.")
+            except Exception as ext_err:
+                print(f"{prefix}ERRO DE EXTRAÇÃO (Tabela de Atas): {ext_err}")
+        else:
+            ata_num = 'Sem Ata Vigente'
+
+        # 6. Enfileira os dados coletados para gravação em lote no banco
+        print(f"{prefix}Coletado: Nome={item_nome_real}, Ata={ata_num}, Validade={validade_ata}, Valor Ata={valor_unitario_ata}, Validade Ref={validade_valor_referencia}, Valor Ref={valor_unitario_referencia}")
+        # Sem nome lido, o writer preserva o nome atual (para não sobrescrever com None se falhar a leitura)
+        writer.add(item_ids, codigo_gce, item_nome=item_nome_real, ata=ata_num, validade_ata=validade_ata,
+                   valor_unitario_ata=valor_unitario_ata, validade_valor_referencia=validade_valor_referencia,
+                   valor_unitario_referencia=valor_unitario_referencia)
+        return "coletado"
+
+    except Exception as e:
+        print(f"{prefix}Falha geral ao processar item {codigo_gce}: {e}")
+        page.screenshot(path=f"debug_ata_{codigo_gce}.png")
+        return "erro"
+
+    # 7. Retorna para a tela de busca ao final do item
+    finally:
+        try:
+            with metrics.phase("navegacao"):
+                page.goto(SEARCH_URL)
+        except Exception as nav_err:
+            print(f"{prefix}AVISO: Falha ao retornar para a tela de busca: {nav_err}")
+
+def run_worker(worker_id, items, storage_state, prefix="", lean=LEAN, run_id=None, vigentes=None, deadline=None,
+               current=None):
+    """
+    Processa uma fatia dos códigos (codigo_gce, [ids]) em um navegador próprio, reaproveitando a sessão já autenticada.
+    vigentes é o índice da listagem de atas vigentes (modo combinado), consultado só para leitura.
+    deadline (time.monotonic) encerra o worker antes do próximo código; os restantes contam como adiados.
+    current são os valores atuais dos itens da execução, para que o writer grave só o que mudou.
+    Cada worker tem seu próprio Playwright, navegador e conexão com o banco, de modo que
+    uma falha (ex: navegador travado) afeta somente os itens do próprio worker.
+    """
+    stats = {"coletado": 0, "invalido": 0, "nao_encontrado": 0, "sem_resposta": 0, "erro": 0, "adiado": 0}
+    print(f"{prefix}Iniciando worker com {len(items)} códigos.")
+
+    conn = None
+    writer = None
+    try:
+        conn = get_db_connection()
+        # O writer grava em segundo plano enquanto o navegador segue para o próximo item
+        writer = QueuedWriter(AtaWriter(conn, prefix=prefix, run_id=run_id, current=current), prefix=prefix)
+
+        with sync_playwright() as p:
+            browser = launch_browser(p)
+            traffic = TrafficMonitor(lean)
+            context = new_context(browser, storage_state, traffic)
+            page = context.new_page()
+
+            for codigo_gce, item_ids in items:
+                started = time.monotonic()
+                if deadline and started >= deadline:
+                    # Os códigos vêm em ordem de urgência: o que sobrou é o menos urgente
+                    stats["adiado"] = len(items) - sum(stats.values())
+                    print(f"{prefix}Tempo da execução esgotado: {stats['adiado']} códigos adiados para a próxima.")
+                    break
+                status = process_item(page, writer, item_ids, codigo_gce, prefix, (vigentes or {}).get(codigo_gce))
+                metrics.observe_item(time.monotonic() - started)
+                stats[status] += 1
+                # Itens sem dados a gravar também contam como concluídos para a retomada; os com erro ou
+                # sem resposta do portal não, para que um --resume depois de uma queda os tente de novo
+                if status in ("invalido", "nao_encontrado"):
+                    # Só a ausência confirmada pelo portal entra no cache negativo
+                    writer.mark_done(item_ids, codigo_gce if status == "nao_encontrado" else None)
+
+            browser.close()
+            traffic.report(prefix)
+    except Exception as e:
+        processed = sum(stats.values())
+        print(f"{prefix}ERRO CRÍTICO no worker após {processed} de {len(items)} códigos: {e}")
+        stats["erro"] += len(items) - processed
+        stats["falha_worker"] = 1
+    finally:
+        # Grava o que já foi coletado mesmo se o navegador tiver falhado no meio
+        if writer:
+            try:
+                writer.close()
+            except Exception as db_err:
+                print(f"{prefix}ERRO DE BANCO ao gravar o último lote: {db_err}")
+            stats["atualizado"] = writer.stats["atualizado"]
+            stats["sem_alteracao"] = writer.stats["sem_alteracao"]
+            stats["erro_banco"] = writer.stats["erro"]
+        if conn:
+            conn.close()
+
+    print(f"{prefix}Worker finalizado: {stats}")
+    return stats
+
+def parse_shard(text):
+    """'2/4' -> (2, 4). Aceita None/vazio (sem divisão)."""
+    if not text:
+        return None
+    try:
+        index, total = (int(part) for part in str(text).split("/"))
+    except ValueError:
+        raise ValueError(f"Shard inválido '{text}': use o formato i/N (ex: 2/4)")
+    if total < 1 or not 1 <= index <= total:
+        raise ValueError(f"Shard inválido '{text}': i deve estar entre 1 e N")
+    return index, total
+
+def shard_of(codigo_gce, total):
+    """Fatia (1 a total) do código: CRC32 do código normalizado, estável entre processos e máquinas."""
+    return zlib.crc32(str(codigo_gce).strip().encode("utf-8")) % total + 1
+
+def select_items(cur, full=False, max_age_days=MAX_AGE_DAYS, expiry_window_days=EXPIRY_WINDOW_DAYS,
+                 recent_movement_days=RECENT_MOVEMENT_DAYS, shard=None, negative_ttl_days=NEGATIVE_TTL_DAYS):
+    """
+    Seleciona os itens com código GCE e separa os que precisam ser consultados dos que ainda estão atualizados.
+    Um item é considerado desatualizado se nunca foi consultado, se a última consulta tem mais de
+    max_age_days dias, se a ata ou o valor de referência vencem em até expiry_window_days dias
+    (ou já venceram) ou se o item está sem ata vigente (nula, em branco ou 'Sem Ata Vigente'). Códigos
+    que o portal confirmou não existir há menos de negative_ttl_days dias ficam de fora (cache negativo).
+    Com full=True todos são consultados.
+    Os itens vêm em ordem de urgência: primeiro os que vencem dentro da janela (o vencimento mais
+    próximo antes), depois os nunca consultados, os movimentados nos últimos recent_movement_days
+    dias e por fim os demais, da consulta mais antiga para a mais recente.
+    Com shard (i, N) só entram os itens cujo código cai na fatia i; todos os itens de um código
+    caem na mesma fatia, então cada código é consultado por um único processo.
+    Retorna (itens_a_consultar, quantidade_ignorada, codigos_com_referencia_desatualizada, codigos_no_cache_negativo):
+    o conjunto de códigos diz quais precisam do detalhe do item mesmo quando a ata vem da listagem, e o
+    cache negativo é contado em códigos distintos (um código pode ter vários itens).
+    """
+    cur.execute("""
+        SELECT i.id, i.codigo_gce,
+               (c.consultado_em IS NULL
+                OR c.consultado_em < now() - make_interval(days => %s)
+                OR i.validade_ata < now() + make_interval(days => %s)
+                OR i.validade_valor_referencia < now() + make_interval(days => %s)
+                OR NULLIF(TRIM(i.ata), '') IS NULL
+                OR i.ata = 'Sem Ata Vigente') AS desatualizado,
+               (c.consultado_em IS NULL
+                OR c.consultado_em < now() - make_interval(days => %s)
+                OR i.validade_valor_referencia IS NULL
+                OR i.validade_valor_referencia < now() + make_interval(days => %s)
+                OR i.item_nome IS NULL) AS referencia_desatualizada,
+               (c.resultado = 'nao_encontrado'
+                AND c.consultado_em > now() - make_interval(days => %s)) AS cache_negativo
+        FROM items i
+        LEFT JOIN gce_consultas c ON c.codigo_gce = TRIM(i.codigo_gce)
+        LEFT JOIN (
+            SELECT item_id, max(data_movimento) AS ultima_movimentacao
+            FROM movimentos
+            WHERE data_movimento > now() - make_interval(days => %s)
+            GROUP BY item_id
+        ) m ON m.item_id = i.id
+        WHERE i.codigo_gce IS NOT NULL
+        ORDER BY
+            CASE
+                WHEN LEAST(i.validade_ata, i.validade_valor_referencia) < now() + make_interval(days => %s) THEN 0
+                WHEN c.consultado_em IS NULL THEN 1
+                WHEN m.ultima_movimentacao IS NOT NULL THEN 2
+                ELSE 3
+            END,
+            LEAST(i.validade_ata, i.validade_valor_referencia) NULLS LAST,
+            m.ultima_movimentacao DESC NULLS LAST,
+            c.consultado_em NULLS FIRST
+    """, (max_age_days, expiry_window_days, expiry_window_days, max_age_days, expiry_window_days,
+          negative_ttl_days, recent_movement_days, expiry_window_days))
+    rows = cur.fetchall()
+    if shard:
+        rows = [row for row in rows if shard_of(row[1], shard[1]) == shard[0]]
+
+    negative = 0 if full else len({str(row[1]).strip() for row in rows if row[2] and row[4]})
+    items = [(item_id, codigo_gce) for item_id, codigo_gce, desatualizado, _, cached in rows
+             if full or (desatualizado and not cached)]
+    referencia = {str(codigo_gce).strip() for _, codigo_gce, desatualizado, ref, cached in rows
+                  if full or (desatualizado and ref and not cached)}
+    return items, len(rows) - len(items), referencia, negative
+
+def group_by_codigo(items):
+    """
+    Agrupa os itens pelo código GCE normalizado: a tabela items tem uma linha por setor, então o
+    mesmo código aparece várias vezes. Retorna [(codigo_gce, [ids]), ...] na ordem da primeira ocorrência
+    (com os itens em ordem de urgência, cada código fica na posição do seu item mais urgente).
+    """
+    groups = {}
+    for item_id, codigo_gce in items:
+        groups.setdefault(str(codigo_gce).strip(), []).append(item_id)
+    return list(groups.items())
+
+def apply_listing(codigos, vigentes, referencia, run_id, current=None):
+    """
+    Modo combinado: grava direto do índice da listagem os códigos cujo valor de referência ainda está
+    em dia, sem abrir o detalhe. Retorna (códigos que ainda precisam do detalhe, estatísticas da gravação).
+    """
+    listing_only = [(codigo, ids) for codigo, ids in codigos if codigo in vigentes and codigo not in referencia]
+    remaining = [(codigo, ids) for codigo, ids in codigos if codigo not in vigentes or codigo in referencia]
+    with_ata = sum(1 for codigo, _ in remaining if codigo in vigentes)
+    print(f"Modo combinado: {len(listing_only)} códigos resolvidos só pela listagem, {with_ata} precisam do detalhe "
+          f"apenas para o valor de referência e {len(remaining) - with_ata} não constam da listagem.")
+    if not listing_only:
+        return remaining, {}
+
+    conn = get_db_connection()
+    try:
+        writer = AtaWriter(conn, run_id=run_id, current=current)
+        for codigo, ids in listing_only:
+            ata, validade, valor = vigentes[codigo]
+            writer.add(ids, codigo, somente_ata=True, ata=ata, validade_ata=validade, valor_unitario_ata=valor)
+        writer.close()
+    finally:
+        conn.close()
+    stats = {"listagem": len(listing_only), "atualizado": writer.stats["atualizado"],
+             "sem_alteracao": writer.stats["sem_alteracao"], "erro_banco": writer.stats["erro"]}
+    return remaining, stats
+
+def update_atas(workers=WORKERS, full=False, max_age_days=MAX_AGE_DAYS, expiry_window_days=EXPIRY_WINDOW_DAYS, lean=LEAN,
+                resume=False, combined=COMBINED, time_budget_minutes=TIME_BUDGET_MINUTES, shard=None,
+                negative_ttl_days=NEGATIVE_TTL_DAYS):
+    """
+    Consulta no GCE os itens desatualizados (ou todos, com full=True) e grava o resultado no banco.
+    Retorna o resumo da execução gravado nas métricas (gce_metrics), com o status final em "status":
+    'concluida', 'interrompida' ou a falha que impediu a execução ('falha_login', 'falha_banco', ...).
+    """
+    # Cada shard tem o próprio diário (retomada independente) e o próprio relatório de métricas
+    script = f"update_atas_shard{shard[0]}-{shard[1]}" if shard else "update_atas"
+    # O relatório é gravado em toda saída, mesmo sem itens a consultar: o merge_reports conta com o
+    # arquivo de cada shard e o alerta de execução atrasada lê o horário da última gravação
+    metrics.start("update_atas", shard=shard)
+
+    # O orçamento de tempo conta desde a partida, incluindo login e leitura da listagem
+    deadline = time.monotonic() + time_budget_minutes * 60 if time_budget_minutes else None
+
     # 1. Conecta ao banco para buscar itens
     try:
         if not all([ORG, MATRICULA, PASSWORD]):
             print("ERRO CRÍTICO: Credenciais GCE (ORG, MATRICULA, PASSWORD) não encontradas no ambiente.")
-            return
+            return metrics.write("falha_credenciais")
 
         print("Conectando ao banco de dados...")
         conn = get_db_connection()
+        ensure_schema(conn)
+        cur = conn.cursor()
+        items, skipped, referencia, negative = select_items(cur, full, max_age_days, expiry_window_days, shard=shard,
+                                                            negative_ttl_days=negative_ttl_days)
+        cur.close()
+        if shard:
+            print(f"Shard {shard[0]}/{shard[1]}: só os códigos desta fatia serão consultados.")
+        if full:
+            print(f"Modo completo: {len(items)} itens para verificar.")
+        else:
+            print(f"Modo incremental: {len(items)} itens para verificar, {skipped} ignorados por estarem atualizados "
+                  f"(consultados há menos de {max_age_days} dias e sem vencimento nos próximos {expiry_window_days} dias).")
+            if negative:
+                print(f"Entre os ignorados, {negative} código(s) que o GCE informou não existir nos últimos "
+                      f"{negative_ttl_days} dias (cache negativo).")
+        if not items:
+            conn.close()
+            metrics.set_counters({"ignorado": skipped, "cache_negativo": negative})
+            return metrics.write("concluida")
+
+        # Diário da execução: com --resume, pula os itens já concluídos pela execução interrompida
+        params = {"full": full, "workers": workers, "combined": combined, "time_budget_minutes": time_budget_minutes,
+                  "shard": f"{shard[0]}/{shard[1]}" if shard else None}
+        run_id, resumed, _ = start_run(conn, script, resume, params)
+        metrics.run_id = run_id
+        if resumed:
+            done = load_done_items(conn, run_id)
+            items = [item for item in items if item[0] not in done]
+            print(f"Retomada: {len(done)} itens já concluídos, {len(items)} restantes.")
+            if not items:
+                finish_run(conn, run_id)
+                conn.close()
+                metrics.set_counters({"ignorado": skipped, "cache_negativo": negative})
+                return metrics.write("concluida")
+
+        # Valores atuais de todos os itens da execução em uma consulta: os writers comparam em memória
+        # e só gravam os itens em que algo mudou
         cur = conn.cursor()
-        # Assume-se que a tabela é 'items' e tem os campos 'id', 'codigo_gce', 'ata', 'validade_ata', 'valor_unitario_ata'
-        cur.execute("SELECT id, codigo_gce FROM items WHERE codigo_gce IS NOT NULL")
-        items = cur.fetchall()
-        print(f"Encontrados {len(items)} itens para verificar.")
+        current = load_current_values(cur, [item_id for item_id, _ in items])
+        cur.close()
+        conn.close()
     except Exception as e:
         print(f"Erro ao conectar ao banco de dados ou buscar itens: {e}")
-        return
+        return metrics.write("falha_banco")
+
+    # Cada código distinto é consultado uma única vez e o resultado vale para todos os seus itens
+    codigos = group_by_codigo(items)
+    lookups_saved = len(items) - len(codigos)
+    print(f"{len(items)} itens compartilham {len(codigos)} códigos GCE distintos: "
+          f"{lookups_saved} consultas ao portal economizadas.")
 
+    # 2. Obtém a sessão autenticada (cache em disco ou login) uma única vez e captura o estado (cookies + local storage)
     with sync_playwright() as p:
-        # Inicia o navegador (Headless True por padrão no Docker)
-        is_headless = os.getenv("HEADLESS", "true").lower() == "true"
-        browser = p.chromium.launch(headless=is_headless)
-        context = browser.new_context()
-        page = context.new_page()
+        browser = launch_browser(p)
+        with metrics.phase("login"):
+            context, page = open_session(browser, SEARCH_URL, "#textoPesquisaItem", TrafficMonitor(lean))
+        if context is None:
+            browser.close()
+            return metrics.write("falha_login")
+        storage_state = context.storage_state()
 
-        # Login
-        print(f"Navegando para {SEARCH_URL}...")
-        page.goto(SEARCH_URL)
+        # Modo combinado: uma leitura da listagem de atas vigentes substitui a tabela de atas de cada item
+        vigentes = None
+        if combined:
+            with metrics.phase("listagem"):
+                vigentes = load_vigencia_index(context, page)
+            if vigentes is None:
+                print("AVISO: Listagem de atas vigentes indisponível. Seguindo com o detalhe de cada item.")
+        browser.close()
 
+    totals = {}
+    if vigentes:
         try:
-            # Espera carregar ou detecta login
-            print("Aguardando carregamento da página...")
-            page.wait_for_selector("#login, #textoPesquisaItem", timeout=30000)
-            
-            if page.locator("#login").is_visible():
-                print("Tela de login detectada. Realizando login...")
-                
-                # Preenche os campos com seletores mais específicos para evitar ambiguidade
-                # O portal GCE possui múltiplos elementos com o mesmo ID para diferentes tipos de login
-                print("Preenchendo credenciais...")
-                page.locator('input#login[placeholder="Organização"]').fill(ORG)
-                page.locator('input#matricula[placeholder="Matrícula"]').fill(MATRICULA)
-                
-                # Tenta preencher a senha e verifica se foi preenchida
-                password_selector = 'input#password[placeholder="Senha"]'
-                page.wait_for_selector(password_selector, timeout=10000)
-                password_field = page.locator(password_selector)
-                password_field.fill(PASSWORD)
-                
-                # Pequena pausa para garantir que o sistema processou o preenchimento
-                time.sleep(1)
-                
-                if not password_field.input_value():
-                    print("ERRO CRÍTICO: Campo de senha não foi preenchido corretamente.")
-                    browser.close()
-                    return
-
-                print("Campos preenchidos. Enviando formulário...")
-                page.screenshot(path="debug_before_login.png")
-                page.click('#btnLogin')
-                page.wait_for_timeout(5000)
-                page.screenshot(path="login_after_btn.png")
-                page.goto(SEARCH_URL)
-                # Valida se o login teve sucesso procurando pelo campo de pesquisa
-                print("Aguardando validação de login...")
-                try:
-                    page.wait_for_selector("#textoPesquisaItem", timeout=20000)
-                    print("Login realizado com sucesso!")
-                except:
-                    print("ERRO: Falha ao validar login. O campo de pesquisa não apareceu.")
-                    page.screenshot(path="login_failed.png")
-                    browser.close()
-                    return
-            else:
-                print("Já logado ou campo de pesquisa já visível.")
+            codigos, totals = apply_listing(codigos, vigentes, referencia, run_id, current)
         except Exception as e:
-            print(f"Erro crítico durante o processo de login: {e}")
-            page.screenshot(path="login_error.png")
-            browser.close()
-            return
-
-        for item_id, codigo_gce in items:
-            print(f"\n--- Processando Item GCE: {codigo_gce} ---")
-            
-            # Variáveis para coleta de dados
-            ata_num = None
-            validade_ata = None
-            valor_unitario_ata = None
-            valor_unitario_referencia = None
-            validade_valor_referencia = None
-            
-            try:
-                # 0. Valida o formato do código GCE
-                if not codigo_gce or not re.match(r"^\d{4}\.\d{4}\.\d{6}$", str(codigo_gce).strip()):
-                    print(f"Ignorando item '{codigo_gce}': Formato inválido.")
-                    continue
+            print(f"ERRO DE BANCO ao gravar os dados da listagem: {e}. Esses códigos seguirão pelo detalhe.")
 
-                # Navega para a tela de busca
-                page.goto(SEARCH_URL)
-                
-                # Aguarda o campo de pesquisa estar pronto
-                page.wait_for_selector("#textoPesquisaItem", timeout=10000)
-                
-                # 1. Busca o código GCE
-                print(f"Pesquisando código {codigo_gce}...")
-                search_input = page.locator("#textoPesquisaItem")
-                search_input.fill(str(codigo_gce))
-                page.keyboard.press("Enter")
-                
-                # 2. Aguarda o resultado e dá clique duplo
-                try:
-                    # Espera aparecer um item selecionável
-                    item_selector = f"li:has-text('{codigo_gce}')"
-                    page.wait_for_selector(item_selector, timeout=15000)
-                    
-                    target_item = page.locator(item_selector).first
-                    if target_item.is_visible():
-                        print(f"Item encontrado. Abrindo detalhes...")
-                        target_item.dblclick()
-                        # Pequeno delay para garantir carregamento do detalhe
-                        time.sleep(1)
-                    else:
-                        print(f"AVISO: Código {codigo_gce} não encontrado.")
-                        continue
-                except:
-                    print(f"AVISO: Item {codigo_gce} não apareceu ou erro ao clicar.")
-                    continue
-
-                # 2.A. Coleta o Nome do Modificador (Nome Real do Item)
-                # O usuário pediu para ler o value do input #NomeModificador após abrir os detalhes
-                item_nome_real = None
-                try:
-                    nome_selector = "#NomeModificador"
-                    page.wait_for_selector(nome_selector, timeout=5000)
-                    item_nome_real = page.locator(nome_selector).get_attribute("value")
-                    
-                    if item_nome_real:
-                        print(f"Nome do Item detectado: {item_nome_real}")
-                    else:
-                        print("AVISO: Campo NomeModificador vazio.")
-                except Exception as e:
-                     print(f"AVISO: Não foi possível ler o NomeModificador: {e}")
-
-                # 3. Coleta Validade do Valor de Referência (comum a todos os casos)
-                try:
-                    page.wait_for_selector("#DataValidadeVuma", timeout=5000)
-                    # Tenta pegar pelo value ou input_value
-                    raw_val = page.locator("#DataValidadeVuma").first.get_attribute("value")
-                    if not raw_val:
-                        raw_val = page.locator("#DataValidadeVuma").first.input_value()
-                        
-                    if raw_val and "/" in raw_val:
-                        # Formato: "23/08/2025 00:00:00" -> "2025-08-23"
-                        d, m, rest = raw_val.split("/")
-                        y = rest.split(" ")[0]
-                        validade_valor_referencia = f"{y}-{m}-{d}"
-                except Exception as e:
-                    print(f"DEBUG: Não foi possível capturar validade de referência: {e}")
-                
-                # 4. Coleta Valor Unitário de Referência (comum a todos os casos)
-                try:
-                    page.wait_for_selector("#ValorVumaGlobal", timeout=5000)
-                    # Tenta pegar pelo value ou input_value
-                    valor_unitario_referencia = page.locator("#ValorVumaGlobal").first.input_value()
-                    # Converte formato brasileiro (ex: 2.315,31) para SQL (2315.31)
-                    
-                    valor_unitario_referencia = valor_unitario_referencia.replace(".", "").replace(",", ".")
-                    valor_unitario_referencia = float(valor_unitario_referencia)
-                    valor_unitario_referencia = round(valor_unitario_referencia, 2)            
-                except Exception as e:
-                    print(f"DEBUG: Não foi possível capturar validade de referência: {e}")
-
-                # 5. Verifica se há Ata Vigente
-                page.wait_for_selector("#ItemAtaVigente", timeout=15000)
-                ata_vigente = page.locator("#ItemAtaVigente").input_value()
-                print(f"Ata Vigente? {ata_vigente}")
-
-                if ata_vigente == "Sim":
-                    print("Consultando Atas Vigentes...")
-                    page.click("#btnAtasVigentes")
-                    
-                    # Extrai detalhes da tabela de Atas
-                    try:
-                        # Espera a tabela carregar e pega a primeira linha de dados
-                        page.wait_for_selector("tr.odd, tr.even", timeout=12000)
-                        row = page.locator("tr.odd, tr.even").first
-                        cells = row.locator("td").all_text_contents()
-                        
-                        if len(cells) >= 5:
-                            ata_num = cells[0].strip()
-                            validade_ata_raw = cells[2].strip()
-                            valor_unitario_raw = cells[4].strip()
-
-                            # Converte data brasileira (DD/MM/YYYY) para ISO (YYYY-MM-DD)
-                            try:
-                                d, m, y = validade_ata_raw.split("/")
-                                validade_ata = f"{y}-{m}-{d}"
-                            except Exception as e:
-                                print(f"AVISO: Falha ao converter data '{validade_ata_raw}': {e}")
-                                validade_ata = None # Define como None se falhar
-
-                            # Converte formato brasileiro (ex: 2.315,31) para SQL (2315.31)
-                            valor_unitario_ata = valor_unitario_raw.replace(".", "").replace(",", ".")
-                        else:
-                            print(f"AVISO: Linha da tabela de atas para {codigo_gce} incompleta.")
-                    except Exception as ext_err:
-                        print(f"ERRO DE EXTRAÇÃO (Tabela de Atas): {ext_err}")
-                else:
-                    ata_num = 'Sem Ata Vigente'
-
-                # 6. Atualiza o banco de dados com os dados coletados
-                print(f"Atualizando DB: Nome={item_nome_real}, Ata={ata_num}, Validade={validade_ata}, Valor Ata={valor_unitario_ata}, Validade Ref={validade_valor_referencia}, Valor Ref={valor_unitario_referencia}")
-                try:
-                    # Prepara a query dinamicamente se tiver nome ou não (para não sobrescrever com None se falhar a leitura)
-                    if item_nome_real:
-                         cur.execute("""
-                            UPDATE items 
-                            SET item_nome = %s, ata = %s, validade_ata = %s, valor_unitario_ata = %s, validade_valor_referencia = %s, valor_unitario_referencia = %s
-                            WHERE id = %s
-                        """, (item_nome_real, ata_num, validade_ata, valor_unitario_ata, validade_valor_referencia, valor_unitario_referencia, item_id))
-                    else:
-                        cur.execute("""
-                            UPDATE items 
-                            SET ata = %s, validade_ata = %s, valor_unitario_ata = %s, validade_valor_referencia = %s, valor_unitario_referencia = %s
-                            WHERE id = %s
-                        """, (ata_num, validade_ata, valor_unitario_ata, validade_valor_referencia, valor_unitario_referencia, item_id))
-                        
-                    conn.commit()
-                    if cur.rowcount > 0:
-                        print(f"Item {codigo_gce} atualizado com sucesso.")
-                    else:
-                        print(f"AVISO: Nenhuma linha atualizada para o ID {item_id}.")
-                except Exception as db_err:
-                    print(f"ERRO DE BANCO: {db_err}")
-                    conn.rollback()
-
-            except Exception as e:
-                print(f"Falha geral ao processar item {codigo_gce}: {e}")
-                try:
-                    conn.rollback()
-                except:
-                    pass
-                page.screenshot(path=f"debug_ata_{codigo_gce}.png")
-            
-            # 7. Retorna para a tela de busca ao final do loop
-            finally:
-                page.goto(SEARCH_URL)
-                
-        print("\nProcessamento concluído.")
-        browser.close()
-        cur.close()
+    # 3. Divide os códigos entre os workers (round-robin) e processa em paralelo
+    results = []
+    if codigos:
+        workers = max(1, min(workers, len(codigos)))
+        chunks = [codigos[i::workers] for i in range(workers)]
+        print(f"Distribuindo {len(codigos)} códigos entre {workers} worker(s)...")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(run_worker, i + 1, chunk, storage_state, f"[W{i + 1}] " if workers > 1 else "", lean, run_id,
+                                vigentes, deadline, current)
+                for i, chunk in enumerate(chunks)
+            ]
+            results = [f.result() for f in futures]
+
+    for stats in results:
+        for status, count in stats.items():
+            totals[status] = totals.get(status, 0) + count
+
+    totals["ignorado"] = skipped
+    totals["cache_negativo"] = negative
+    totals["consultas_economizadas"] = lookups_saved
+    print(f"\nProcessamento concluído. Resumo: {totals}")
+
+    # Uma execução com worker interrompido fica aberta no diário para ser retomada com --resume
+    status = "interrompida" if totals.get("falha_worker") else "concluida"
+    metrics.set_counters(totals)
+    summary = metrics.write(status)
+    try:
+        conn = get_db_connection()
+        finish_run(conn, run_id, status)
         conn.close()
+    except Exception as e:
+        print(f"AVISO: Não foi possível fechar a execução {run_id} no diário: {e}")
+    return summary
 
 if __name__ == "__main__":
-    if not all([ORG, MATRICULA, PASSWORD, DB_NAME, DB_USER, DB_PASS]):
+    parser = argparse.ArgumentParser(description="Atualiza dados de atas dos itens a partir do GCE.")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Quantidade de navegadores em paralelo (padrão: GCE_WORKERS ou 1)")
+    parser.add_argument("--full", action="store_true",
+                        help="Consulta todos os itens, ignorando a política de atualização incremental")
+    parser.add_argument("--max-age-days", type=int, default=MAX_AGE_DAYS,
+                        help="Reconsulta itens cuja última consulta tem mais de N dias (padrão: GCE_MAX_AGE_DAYS ou 30)")
+    parser.add_argument("--expiry-window-days", type=int, default=EXPIRY_WINDOW_DAYS,
+                        help="Reconsulta itens cuja ata ou valor de referência vence em até N dias (padrão: GCE_EXPIRY_WINDOW_DAYS ou 30)")
+    parser.add_argument("--negative-ttl-days", type=int, default=NEGATIVE_TTL_DAYS,
+                        help="Não reconsulta por N dias códigos que o GCE informou não existir (padrão: GCE_NEGATIVE_TTL_DAYS ou 7)")
+    parser.add_argument("--lean", action="store_true", default=LEAN,
+                        help="Perfil enxuto: bloqueia imagens, fontes, CSS e scripts de terceiros (padrão: GCE_LEAN)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Retoma a última execução interrompida, pulando os itens que ela já concluiu")
+    parser.add_argument("--time-budget", type=float, default=TIME_BUDGET_MINUTES, metavar="MINUTOS",
+                        help="Encerra a execução após N minutos, consultando antes os itens mais urgentes; "
+                             "os restantes ficam para a próxima (padrão: GCE_TIME_BUDGET_MINUTES ou 0, sem limite)")
+    parser.add_argument("--shard", type=parse_shard, default=SHARD, metavar="i/N",
+                        help="Processa só a fatia i de N dos códigos (hash estável do código GCE), para dividir a "
+                             "execução entre vários containers (padrão: GCE_SHARD)")
+    parser.add_argument("--merge-reports", action="store_true",
+                        help="Só junta os relatórios de métricas dos shards (mesmo GCE_METRICS_DIR) em um único e sai")
+    parser.add_argument("--combined", action="store_true", default=COMBINED,
+                        help="Lê antes a listagem de atas vigentes e abre o detalhe só para o valor de referência "
+                             "ou para códigos fora da listagem (padrão: GCE_COMBINED)")
+    args = parser.parse_args()
+    print("Script update_atas.py iniciado...")
+
+    if args.merge_reports:
+        merge_reports("update_atas")
+    elif not all([ORG, MATRICULA, PASSWORD, DB_NAME, DB_USER, DB_PASS]):
         print("ERRO: Verifique se todas as variáveis GCE e DB estão no seu arquivo .env")
     else:
-        update_atas()
+        update_atas(workers=args.workers, full=args.full, max_age_days=args.max_age_days,
+                    expiry_window_days=args.expiry_window_days, lean=args.lean, resume=args.resume,
+                    combined=args.combined, time_budget_minutes=args.time_budget, shard=args.shard,
+                    negative_ttl_days=args.negative_ttl_days)